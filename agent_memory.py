@@ -0,0 +1,83 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain_core.messages import get_buffer_string, messages_from_dict, messages_to_dict
+from pydantic import PrivateAttr
+from config import Config
+from database import migrate
+
+def estimate_tokens(messages):
+    """Cheap local token estimate (~4 characters per token), no API round trip"""
+    return len(get_buffer_string(messages)) // 4
+
+class PersistentSummaryMemory(ConversationSummaryBufferMemory):
+    """Last K turns verbatim plus a rolling summary, persisted per user"""
+
+    max_turns: int = 6
+    username: Optional[str] = None
+    db_name: str = 'research_chat.db'
+    _local: threading.local = PrivateAttr(default_factory=threading.local)
+
+    @classmethod
+    def for_user(cls, llm, username=None, db_name='research_chat.db'):
+        """Build the memory and restore the user's saved summary and recent turns"""
+        migrate(db_name)
+        memory = cls(
+            llm=llm,
+            max_token_limit=Config.AGENT_MEMORY_MAX_TOKENS,
+            max_turns=Config.AGENT_MEMORY_MAX_TURNS,
+            return_messages=True,
+            memory_key="chat_history",
+            username=username,
+            db_name=db_name
+        )
+        memory.restore()
+        return memory
+
+    def _get_connection(self):
+        if not hasattr(self._local, 'conn'):
+            self._local.conn = sqlite3.connect(self.db_name)
+        return self._local.conn
+
+    def restore(self):
+        if self.username is None:
+            return
+        row = self._get_connection().execute(
+            "SELECT summary, messages FROM agent_memory WHERE username = ?", (self.username,)
+        ).fetchone()
+        if row:
+            self.moving_summary_buffer = row[0] or ""
+            self.chat_memory.messages = messages_from_dict(json.loads(row[1]))
+
+    def persist(self):
+        if self.username is None:
+            return
+        with self._get_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO agent_memory (username, summary, messages, updated_at) VALUES (?, ?, ?, ?)",
+                (self.username, self.moving_summary_buffer,
+                 json.dumps(messages_to_dict(self.chat_memory.messages)), time.time())
+            )
+
+    def prune(self):
+        """Fold turns beyond the last K, or over the token budget, into the summary"""
+        buffer = self.chat_memory.messages
+        pruned = []
+        # Always keep the latest exchange verbatim
+        while len(buffer) > 2 and (
+            len(buffer) > self.max_turns * 2 or estimate_tokens(buffer) > self.max_token_limit
+        ):
+            pruned.append(buffer.pop(0))
+        if pruned:
+            self.moving_summary_buffer = self.predict_new_summary(pruned, self.moving_summary_buffer)
+
+    def save_context(self, inputs, outputs):
+        super().save_context(inputs, outputs)
+        self.persist()
+
+    def clear(self):
+        super().clear()
+        self.persist()
@@ -1,73 +1,375 @@
-from fastapi import FastAPI, HTTPException
-import sqlite3
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+import json
+import time
+import orjson
 from pydantic import BaseModel
-from typing import List
+import events
+from typing import List, Optional
+from async_database import AsyncDatabase
+from compression import get_response_codec, start_background_recompression
+from config import Config
+from database import BEFORE_SQL, SEARCH_SQL, build_fts_query, migrate
+from gemini import build_research_prompt, open_stream_coalesced
+from jobs import JobRunner
+from maintenance import start_maintenance
+from metrics import REGISTRY, MetricsMiddleware
+from model_registry import get_registry
+from pdf import get_pdf_exporter
+from response_cache import etag_matches, get_response_cache
+from singleflight import generation_flight
+from write_behind import WriteBehindQueue
 
-app = FastAPI()
+writes = WriteBehindQueue('research_chat.db', journal_path='research_chat.db.api.journal')
+db = AsyncDatabase(writes.db_name, writes=writes)
+jobs = JobRunner(db)
+
+@asynccontextmanager
+async def lifespan(app):
+    migrate(db.db_name)
+    start_background_recompression(db.db_name)
+    start_maintenance(db.db_name)
+    await db.open()
+    await asyncio.to_thread(writes.start)
+    await jobs.start()
+    yield
+    await jobs.stop()
+    # Durably flush queued likes before the process exits
+    await asyncio.to_thread(writes.close)
+    await db.close()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+def collect_process_stats():
+    """Coalescing and hedging counters, read at scrape time"""
+    flight = generation_flight.stats()
+    hedges = dict(get_registry().hedge_stats)
+    return [
+        ("hermes_generation_upstream_calls_total", "counter", "Generations sent upstream",
+         [({}, flight["upstream_calls"])]),
+        ("hermes_generation_coalesced_total", "counter", "Generations served by an in-flight call",
+         [({}, flight["coalesced"])]),
+        ("hermes_generation_in_flight", "gauge", "Upstream generations in flight",
+         [({}, flight["in_flight"])]),
+        ("hermes_hedge_events_total", "counter", "Hedged generation outcomes",
+         [({"event": event}, count) for event, count in sorted(hedges.items())]),
+    ]
+
+REGISTRY.register_collector(collect_process_stats)
 
 class Conversation(BaseModel):
     id: int
     query: str
     response: str
-    timestamp: str
+    timestamp: int
     likes: int
     model_used: str
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
+
+class JobRequest(BaseModel):
+    queries: List[str]
+    mode: str = "standard"  # "standard" or "sources"
 
-def get_db_connection():
-    conn = sqlite3.connect('research_chat.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+class JobStatus(BaseModel):
+    id: int
+    status: str
+    mode: str
+    total: int
+    pending: int
+    running: int
+    done: int
+    failed: int
+    created_at: int
+    finished_at: Optional[int] = None
+
+class SearchResult(BaseModel):
+    id: int
+    query: str
+    snippet: str
+    rank: float
+
+# Every conversation column, with the response restored from its stored form
+CONVERSATION_COLUMNS = """id, query, hermes_decompress(response) AS response, timestamp, likes, model_used,
+    prompt_tokens, output_tokens, total_tokens"""
+
+async def fetch_conversation(conv_id, columns=CONVERSATION_COLUMNS):
+    """One conversation by id, falling back to the archive once it has been moved there"""
+    conversation = await db.fetch_one(f"SELECT {columns} FROM conversations WHERE id = ?", (conv_id,))
+    if conversation is None and db.archive_attached:
+        conversation = await db.fetch_one(f"SELECT {columns} FROM archive.conversations WHERE id = ?", (conv_id,))
+    return conversation
+
+# Columns an NDJSON import may set; `response` stays second so it can be compressed in place
+IMPORT_COLUMNS = ["query", "response", "timestamp", "likes", "model_used",
+                  "prompt_tokens", "output_tokens", "total_tokens"]
+
+def export_filters(since=None, until=None, username=None, model=None):
+    """WHERE clause, params and an ORDER BY an index can serve without sorting"""
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(until)
+    if model is not None:
+        clauses.append("model_used = ?")
+        params.append(model)
+    if username is not None:
+        # Conversations only belong to a user through their session messages
+        clauses.append(
+            "id IN (SELECT m.conversation_id FROM messages m JOIN sessions s ON s.id = m.session_id "
+            "WHERE s.username = ?)"
+        )
+        params.append(username)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    order = "timestamp, id" if since is not None or until is not None else "id"
+    return where, params, order
+
+def import_values(record, keep_ids):
+    """Insert values for one imported record, with the response still as text"""
+    if not isinstance(record, dict) or not isinstance(record.get("query"), str) \
+            or not isinstance(record.get("response"), str):
+        raise ValueError("expected an object with string query and response")
+    integers = ["timestamp", "likes", "prompt_tokens", "output_tokens", "total_tokens"] + (["id"] if keep_ids else [])
+    for column in integers:
+        if record.get(column) is not None and not isinstance(record[column], int):
+            raise ValueError(f"{column} must be an integer")
+    values = [record.get(column) for column in IMPORT_COLUMNS]
+    values[2] = values[2] or int(time.time())
+    values[3] = values[3] or 0
+    values[4] = values[4] or "unknown"
+    return values + [record.get("id")] if keep_ids else values
+
+async def cached_json(request, key, load):
+    """JSON for key from the response cache, or a 304 when the client's ETag is still current"""
+    responses = get_response_cache()
+    cached = responses.lookup(key)
+    if cached is None:
+        version = responses.version
+        payload = await load()
+        if payload is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        cached = responses.store(key, version, orjson.dumps(payload))
+    etag, body = cached
+    # no-cache lets clients keep the body but makes them revalidate every poll
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+async def ndjson_lines(chunks):
+    """Split a streamed body into lines, holding at most one partial line"""
+    pending = b""
+    async for chunk in chunks:
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            yield line
+    yield pending
+
+def sse_event(data, event=None):
+    """Format a single Server-Sent-Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 @app.get("/conversations/", response_model=List[Conversation])
-def read_conversations(limit: int = 5):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM conversations ORDER BY timestamp DESC LIMIT ?", (limit,))
-    conversations = cursor.fetchall()
-    conn.close()
-    return conversations
+async def read_conversations(request: Request, limit: int = 5, before: Optional[int] = None):
+    """List conversations newest first; pass the last seen id as `before` to page"""
+    async def load():
+        if before is None:
+            return await db.fetch_all(
+                f"SELECT {CONVERSATION_COLUMNS} FROM conversations ORDER BY timestamp DESC, id DESC LIMIT ?", (limit,)
+            )
+        return await db.fetch_all(
+            f"""SELECT {CONVERSATION_COLUMNS} FROM conversations WHERE {BEFORE_SQL}
+                ORDER BY timestamp DESC, id DESC LIMIT :limit""",
+            {"before": before, "limit": limit}
+        )
+
+    return await cached_json(request, ("list", limit, before), load)
+
+@app.get("/conversations/search", response_model=List[SearchResult])
+async def search_conversations(q: str, limit: int = 10):
+    """BM25-ranked full-text search with highlighted snippets"""
+    match = build_fts_query(q)
+    if match is None:
+        return []
+    return await db.fetch_all(SEARCH_SQL, (match, limit))
+
+@app.get("/conversations/export")
+async def export_conversations(since: Optional[int] = None, until: Optional[int] = None,
+                               username: Optional[str] = None, model: Optional[str] = None,
+                               include_archive: bool = True):
+    """Stream conversations as NDJSON, one object per line, in constant memory"""
+    where, params, order = export_filters(since, until, username, model)
+    # Archived rows are the oldest, so they go first
+    tables = ["archive.conversations", "conversations"] if include_archive and db.archive_attached else ["conversations"]
+
+    async def lines():
+        for table in tables:
+            async for rows in db.iterate(
+                f"SELECT {CONVERSATION_COLUMNS} FROM {table} {where} ORDER BY {order}", params, Config.EXPORT_BATCH_SIZE
+            ):
+                yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+    return StreamingResponse(
+        lines(), media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="conversations.ndjson"'}
+    )
+
+@app.post("/conversations/import")
+async def import_conversations(request: Request, keep_ids: bool = False):
+    """Insert conversations from a streamed NDJSON body, IMPORT_BATCH_SIZE rows per transaction.
+
+    Ids are reassigned unless keep_ids is set, in which case rows whose id
+    already exists are skipped. A bad line stops the import with a 422;
+    every line before it has been committed.
+    """
+    codec = get_response_codec(db.db_name)
+    columns = IMPORT_COLUMNS + ["id"] if keep_ids else IMPORT_COLUMNS
+    sql = f"INSERT {'OR IGNORE ' if keep_ids else ''}INTO conversations ({', '.join(columns)}) " \
+          f"VALUES ({', '.join('?' * len(columns))})"
+    imported, skipped, batch = 0, 0, []
+
+    async def flush():
+        nonlocal imported, skipped
+        # Compression is CPU-bound, so it runs on the threadpool
+        rows = await run_in_threadpool(lambda: [[values[0], codec.encode(values[1])] + values[2:] for values in batch])
+        async with db.writer() as conn:
+            cursor = await conn.executemany(sql, rows)
+        imported += cursor.rowcount
+        skipped += len(rows) - cursor.rowcount
+        batch.clear()
+        events.publish("conversations_imported", count=cursor.rowcount)
+
+    number = 0
+    async for line in ndjson_lines(request.stream()):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            batch.append(import_values(orjson.loads(line), keep_ids))
+        except ValueError as e:
+            if batch:
+                await flush()
+            raise HTTPException(status_code=422, detail={"line": number, "error": str(e), "imported": imported})
+        if len(batch) >= Config.IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    return {"imported": imported, "skipped": skipped}
+
+@app.get("/conversations/stream")
+async def stream_conversation(query: str):
+    """Stream a research answer as Server-Sent Events, saving it once complete"""
+    async def event_stream():
+        chunks = []
+        try:
+            # The Gemini client blocks, so start and drain the stream on the threadpool
+            stream, _, model_used = await run_in_threadpool(open_stream_coalesced, build_research_prompt(query))
+            async for chunk in iterate_in_threadpool(stream):
+                chunks.append(chunk)
+                yield sse_event({"text": chunk})
+        except RuntimeError as e:
+            yield sse_event({"detail": str(e)}, event="error")
+            return
+        conv_id = await db.save_conversation(query, "".join(chunks), model_used, usage=stream.usage)
+        yield sse_event({"id": conv_id}, event="done")
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 @app.get("/conversations/{conv_id}", response_model=Conversation)
-def read_conversation(conv_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM conversations WHERE id = ?", (conv_id,))
-    conversation = cursor.fetchone()
-    conn.close()
+async def read_conversation(request: Request, conv_id: int):
+    return await cached_json(request, ("conversation", conv_id), lambda: fetch_conversation(conv_id))
+
+@app.get("/conversations/{conv_id}/pdf")
+async def export_conversation_pdf(conv_id: int):
+    """Conversation as a PDF download, built off the event loop"""
+    conversation = await fetch_conversation(conv_id, "query, hermes_decompress(response) AS response")
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return conversation
+    messages = [
+        {"role": "user", "content": conversation["query"]},
+        {"role": "assistant", "content": conversation["response"]}
+    ]
+    pdf_data = await asyncio.wrap_future(get_pdf_exporter().submit(messages))
+    return Response(
+        pdf_data,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="conversation_{conv_id}.pdf"'}
+    )
 
 @app.post("/conversations/")
-def create_conversation(query: str, response: str, model_used: str = "unknown"):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO conversations (query, response, timestamp, model_used) VALUES (?, ?, datetime('now'), ?)",
-        (query, response, model_used)
-    )
-    conn.commit()
-    conv_id = cursor.lastrowid
-    conn.close()
+async def create_conversation(query: str, response: str, model_used: str = "unknown"):
+    conv_id = await db.save_conversation(query, response, model_used)
     return {"id": conv_id}
 
 @app.put("/conversations/{conv_id}/like")
-def like_conversation(conv_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE conversations SET likes = likes + 1 WHERE id = ?",
-        (conv_id,)
-    )
-    conn.commit()
-    conn.close()
+async def like_conversation(conv_id: int):
+    # Summed in memory and applied in batches by the write-behind thread
+    writes.like(conv_id)
     return {"message": "Like added"}
 
 @app.delete("/conversations/{conv_id}")
-def delete_conversation(conv_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM conversations WHERE id = ?", (conv_id,))
-    conn.commit()
-    conn.close()
-    return {"message": "Conversation deleted"}
\ No newline at end of file
+async def delete_conversation(conv_id: int):
+    async with db.writer() as conn:
+        await conn.execute("DELETE FROM conversations WHERE id = ?", (conv_id,))
+        if db.archive_attached:
+            await conn.execute("DELETE FROM archive.conversations WHERE id = ?", (conv_id,))
+    events.publish("conversation_deleted", conv_id=conv_id)
+    return {"message": "Conversation deleted"}
+
+@app.get("/stats")
+async def read_stats():
+    """Process-level counters, including how many generations were coalesced"""
+    return {"coalescing": generation_flight.stats(), "response_cache": get_response_cache().stats()}
+
+@app.get("/metrics")
+async def read_metrics():
+    """Stage latencies, token usage and request timings in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/jobs")
+async def create_job(request: JobRequest):
+    """Queue a batch of research queries"""
+    if request.mode not in ("standard", "sources"):
+        raise HTTPException(status_code=422, detail="mode must be 'standard' or 'sources'")
+    queries = [query.strip() for query in request.queries if query.strip()]
+    if not queries:
+        raise HTTPException(status_code=422, detail="No queries given")
+    job_id = await jobs.submit(queries, request.mode)
+    return {"id": job_id, "total": len(queries)}
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def read_job(job_id: int):
+    progress = await jobs.progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return progress
+
+@app.get("/jobs/{job_id}/results")
+async def stream_job_results(job_id: int):
+    """Stream finished items as Server-Sent Events until the job completes"""
+    if await jobs.progress(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        sent = set()
+        while True:
+            progress = await jobs.progress(job_id)
+            for item in await jobs.finished_items(job_id):
+                if item["position"] not in sent:
+                    sent.add(item["position"])
+                    yield sse_event(item, event="item")
+            if progress["status"] == "completed":
+                yield sse_event(progress, event="done")
+                return
+            await asyncio.sleep(Config.JOB_POLL_INTERVAL)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import time
+from compression import register_functions
+from config import Config
+
+# Columns carried into the archive; ids are kept so references still resolve
+ARCHIVE_COLUMNS = "id, query, response, timestamp, likes, model_used, prompt_tokens, output_tokens, total_tokens"
+
+
+def archive_path(db_name):
+    """Cold-tier database file kept next to the hot one"""
+    return Config.ARCHIVE_DB_NAME or f"{os.path.splitext(db_name)[0]}_archive.db"
+
+
+def ensure_archive(db_name):
+    """Create the archive database and its table if missing"""
+    conn = sqlite3.connect(archive_path(db_name), isolation_level=None)
+    try:
+        # Only takes effect on a new file, before the first table exists
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY,
+                query TEXT,
+                response TEXT,
+                timestamp INTEGER,
+                likes INTEGER DEFAULT 0,
+                model_used TEXT,
+                prompt_tokens INTEGER,
+                output_tokens INTEGER,
+                total_tokens INTEGER,
+                archived_at INTEGER
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp, id)")
+        conn.execute("PRAGMA journal_mode = WAL")
+    finally:
+        conn.close()
+
+
+def attach_sql(db_name):
+    """(ATTACH statement, params) for the archive, or None when there is no archive yet"""
+    path = archive_path(db_name)
+    if not os.path.exists(path):
+        return None
+    return "ATTACH DATABASE ? AS archive", (path,)
+
+
+def attach_archive(conn, db_name):
+    """Attach the archive as `archive` on a sqlite3 connection; returns whether it exists"""
+    attach = attach_sql(db_name)
+    if attach is not None:
+        conn.execute(*attach)
+    return attach is not None
+
+
+def reserve_archived_ids(conn):
+    """Move the conversations id sequence past every archived id, for archives made before AUTOINCREMENT"""
+    archived = conn.execute("SELECT coalesce(max(id), 0) FROM archive.conversations").fetchone()[0]
+    updated = conn.execute(
+        "UPDATE main.sqlite_sequence SET seq = max(seq, ?) WHERE name = 'conversations'", (archived,)
+    ).rowcount
+    if not updated and archived:
+        conn.execute("INSERT INTO main.sqlite_sequence (name, seq) VALUES ('conversations', ?)", (archived,))
+
+
+def archive_conversations(db_name, older_than=None, batch_size=None, stop=None):
+    """Move old, never-liked conversations to the archive; returns how many moved.
+
+    WAL transactions are only atomic per database file, so each batch is
+    copied and committed first and only then deleted from the hot table.
+    A crash in between leaves a row in both tiers, which the next run
+    resolves by deleting the hot copy. A hot row whose id the archive
+    already holds for a different conversation (ids reused before the
+    table had AUTOINCREMENT) is never moved, so neither is overwritten.
+    """
+    older_than = Config.ARCHIVE_AFTER_DAYS * 86400 if older_than is None else older_than
+    batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+    ensure_archive(db_name)
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    # The archive keeps ids, so session messages must not cascade away with the hot row
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute(f"PRAGMA busy_timeout = {int(Config.DB_BUSY_TIMEOUT_MS)}")
+    register_functions(conn, db_name)
+    attach_archive(conn, db_name)
+    moved = 0
+    try:
+        reserve_archived_ids(conn)
+        cutoff = int(time.time()) - older_than
+        while stop is None or not stop.is_set():
+            ids = [row[0] for row in conn.execute(
+                """SELECT id FROM main.conversations c WHERE timestamp < ? AND likes = 0
+                   AND NOT EXISTS (SELECT 1 FROM archive.conversations a WHERE a.id = c.id
+                                   AND (a.query IS NOT c.query OR a.timestamp IS NOT c.timestamp))
+                   ORDER BY id LIMIT ?""",
+                (cutoff, batch_size)
+            )]
+            if not ids:
+                break
+            marks = ",".join("?" * len(ids))
+            conn.execute("BEGIN")
+            # A plain INSERT, so an unexpected id collision fails instead of replacing a row
+            conn.execute(
+                f"""INSERT INTO archive.conversations ({ARCHIVE_COLUMNS}, archived_at)
+                    SELECT {ARCHIVE_COLUMNS}, ? FROM main.conversations
+                    WHERE id IN ({marks}) AND id NOT IN (SELECT id FROM archive.conversations)""",
+                [int(time.time())] + ids
+            )
+            conn.execute("COMMIT")
+            conn.execute("BEGIN")
+            conn.execute(
+                f"""DELETE FROM main.conversations WHERE id IN ({marks})
+                    AND id IN (SELECT id FROM archive.conversations)""",
+                ids
+            )
+            conn.execute("COMMIT")
+            moved += len(ids)
+    finally:
+        conn.close()
+    return moved
@@ -0,0 +1,111 @@
+import asyncio
+from contextlib import asynccontextmanager
+import aiosqlite
+import events
+from archive import attach_sql
+from compression import get_response_codec
+from config import Config
+
+class AsyncDatabase:
+    """Pooled aiosqlite access with one writer and a bounded set of readers"""
+
+    def __init__(self, db_name='research_chat.db', pool_size=None, busy_timeout_ms=None, writes=None):
+        self.db_name = db_name
+        self.writes = writes  # WriteBehindQueue that serializes conversation inserts
+        self.pool_size = pool_size or Config.DB_POOL_SIZE
+        self.busy_timeout_ms = busy_timeout_ms or Config.DB_BUSY_TIMEOUT_MS
+        self._readers = None
+        self._all_readers = []
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self.archive_attached = False
+
+    async def _connect(self, read_only=False):
+        """Open a connection tuned for concurrent WAL access"""
+        conn = await aiosqlite.connect(self.db_name)
+        conn.row_factory = aiosqlite.Row
+        await conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        await conn.execute("PRAGMA journal_mode = WAL")
+        await conn.execute("PRAGMA synchronous = NORMAL")
+        await conn.execute("PRAGMA foreign_keys = ON")
+        await conn.create_function("hermes_decompress", 1, get_response_codec(self.db_name).decode, deterministic=True)
+        attach = attach_sql(self.db_name)
+        if attach is not None:
+            await conn.execute(*attach)
+        self.archive_attached = attach is not None
+        if read_only:
+            await conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    async def open(self):
+        """Open the writer and fill the reader pool"""
+        if self._writer is not None:
+            return
+        self._writer = await self._connect()
+        self._readers = asyncio.Queue(maxsize=self.pool_size)
+        for _ in range(self.pool_size):
+            conn = await self._connect(read_only=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        """Close every pooled connection"""
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers = []
+        self._readers = None
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def reader(self):
+        """Borrow a read-only connection, waiting if the pool is exhausted"""
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Serialize writes through the single writer connection as one transaction"""
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+    async def fetch_all(self, sql, params=()):
+        async with self.reader() as conn:
+            async with conn.execute(sql, params) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def fetch_one(self, sql, params=()):
+        async with self.reader() as conn:
+            async with conn.execute(sql, params) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row is not None else None
+
+    async def iterate(self, sql, params=(), batch_size=500):
+        """Yield a query's rows in lists of up to batch_size without loading the whole result"""
+        async with self.reader() as conn:
+            async with conn.execute(sql, params) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield [dict(row) for row in rows]
+
+    async def execute(self, sql, params=()):
+        """Run a single write statement and return its cursor"""
+        async with self.writer() as conn:
+            return await conn.execute(sql, params)
+
+    async def save_conversation(self, query, response, model_used, usage=None):
+        """Async counterpart of DatabaseManager.save_conversation, through the write-behind thread"""
+        conv_id = await asyncio.to_thread(self.writes.insert, query, response, model_used, usage)
+        events.publish("conversation_saved", conv_id=conv_id)
+        return conv_id
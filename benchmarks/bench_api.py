@@ -0,0 +1,141 @@
+"""Throughput benchmark for the api.py conversation endpoints.
+
+Drives the ASGI app in-process with httpx against a scratch copy of the
+schema, so it measures handler and database cost without network noise.
+With --llm-latency, the mix also streams answers over SSE from the fake
+Gemini backend in benchmarks/fakes.py. With --poll, it instead replays
+dashboards polling a few conversations with If-None-Match.
+
+    python benchmarks/bench_api.py --requests 2000 --concurrency 50
+    python benchmarks/bench_api.py --poll --requests 10000
+    python benchmarks/bench_api.py --llm-latency lognormal:0.2:0.4 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from fakes import install, percentiles
+
+KINDS = ["create", "like", "get", "list", "stream", "poll"]
+
+
+def seed_database(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY,
+            query TEXT,
+            response TEXT,
+            timestamp DATETIME,
+            likes INTEGER DEFAULT 0,
+            model_used TEXT
+        )
+    ''')
+    conn.executemany(
+        "INSERT INTO conversations (query, response, timestamp, model_used) VALUES (?, ?, CAST(strftime('%s', 'now') AS INTEGER), ?)",
+        [(f"query {i}", "response " * 200, "bench") for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+
+
+async def run(app, total, concurrency, stream=False, poll=False):
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    etags = {}  # url -> last ETag seen, as a polling client would keep it
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                kind = 5 if poll else i % (5 if stream else 4)
+                if kind == 5:
+                    url = "/conversations/?limit=5" if i % 2 else f"/conversations/{i % 20 + 1}"
+                    headers = {"If-None-Match": etags[url]} if url in etags else {}
+                    r = await client.get(url, headers=headers)
+                    etags[url] = r.headers.get("etag", "")
+                elif kind == 0:
+                    r = await client.post("/conversations/", params={"query": f"q{i}", "response": "r", "model_used": "bench"})
+                elif kind == 1:
+                    r = await client.put(f"/conversations/{i % 500 + 1}/like")
+                elif kind == 2:
+                    r = await client.get(f"/conversations/{i % 500 + 1}")
+                elif kind == 3:
+                    r = await client.get("/conversations/", params={"limit": 5})
+                else:
+                    # A few distinct queries, so concurrent streams also coalesce
+                    r = await client.get("/conversations/stream", params={"query": f"topic {i % 7}"})
+                latencies.append((kind, r.status_code, time.perf_counter() - start))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return elapsed, latencies
+
+
+def measure(requests=2000, concurrency=50, rows=1000, llm_latency=None, poll=False):
+    """Run the mix in a scratch directory and return a JSON-ready summary"""
+    workdir = tempfile.mkdtemp(prefix="hermes-bench-")
+    os.chdir(workdir)
+    seed_database("research_chat.db", rows)
+    if llm_latency:
+        install(llm_latency=llm_latency)
+
+    import api
+
+    async def with_lifespan():
+        async with api.app.router.lifespan_context(api.app):
+            return await run(api.app, requests, concurrency, stream=bool(llm_latency), poll=poll)
+
+    elapsed, latencies = asyncio.run(with_lifespan())
+    summary = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "rows": rows,
+        "llm_latency": llm_latency,
+        "errors": sum(1 for _, status, _ in latencies if status >= 400),
+        "not_modified": sum(1 for _, status, _ in latencies if status == 304),
+        "throughput_rps": round(requests / elapsed, 1),
+        **percentiles([l for _, _, l in latencies]),
+        "by_kind": {},
+    }
+    for kind, name in enumerate(KINDS):
+        samples = [l for k, _, l in latencies if k == kind]
+        if samples:
+            summary["by_kind"][name] = {"count": len(samples), **percentiles(samples)}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--llm-latency", help="Latency spec for the fake Gemini backend; adds SSE streams to the mix")
+    parser.add_argument("--poll", action="store_true", help="Conditional GETs only, like polling dashboards")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = measure(args.requests, args.concurrency, args.rows, args.llm_latency, args.poll)
+    if args.json:
+        print(json.dumps(summary))
+        return
+    print(f"requests: {args.requests}  concurrency: {args.concurrency}  errors: {summary['errors']}  "
+          f"not modified: {summary['not_modified']}")
+    print(f"throughput: {summary['throughput_rps']:.0f} req/s")
+    print(f"latency p50: {summary['p50_ms']:.1f} ms  p99: {summary['p99_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Database size vs. read latency for each response storage format.
+
+Seeds one database of synthetic research answers as plain text, then for
+each format copies it, recompresses it with ResponseCodec.recompress()
+(the same path the background migration takes), vacuums it and times
+the reads the app performs: fetching a conversation, full-text search
+with snippets and a history page.
+
+    python benchmarks/bench_compression.py --rows 5000
+    python benchmarks/bench_compression.py --rows 20000 --formats none zlib zstd+dict --json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import percentiles
+
+FORMATS = ["none", "zlib", "zlib+dict", "zstd", "zstd+dict"]
+SECTIONS = ["Key Findings", "Relevant Studies", "Current Challenges", "Future Directions"]
+TOPICS = ["microplastics", "crispr", "fusion", "glaciers", "sleep", "vaccines", "lithium", "coral"]
+
+
+def vocabulary(rng, size=3000):
+    syllables = ["re", "search", "bio", "gen", "cli", "mate", "eco", "sys", "tem", "pro", "tein", "cell",
+                 "neu", "ral", "data", "quan", "tum", "mat", "ter", "ox", "ide", "po", "ly", "mer"]
+    return ["".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))) for _ in range(size)]
+
+
+def response_text(rng, words, paragraphs=12):
+    """Markdown answer shaped like build_research_prompt's structure, about 8-15 KB"""
+    weights = [1 / (rank + 1) for rank in range(len(words))]  # Zipf-like word frequencies
+    lines = []
+    for section in SECTIONS:
+        lines.append(f"## {section}\n")
+        for _ in range(paragraphs // len(SECTIONS)):
+            sentence = " ".join(rng.choices(words, weights, k=rng.randint(60, 110)))
+            source = f"https://doi.org/10.{rng.randint(1000, 9999)}/{rng.randint(10 ** 5, 10 ** 6)}"
+            lines.append(f"- **{sentence[:40].title()}**: {sentence}. [Source: {source}]\n")
+    return "\n".join(lines)
+
+
+def seed_template(path, rows, seed):
+    from compression import register_functions
+    from database import migrate
+
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    migrate(path)
+    conn = sqlite3.connect(path)
+    register_functions(conn, path)
+    now = int(time.time())
+    with conn:
+        conn.executemany(
+            "INSERT INTO conversations (query, response, timestamp, model_used) VALUES (?, ?, ?, 'bench')",
+            [(f"{TOPICS[i % len(TOPICS)]} question {i}", response_text(rng, words), now - rows + i)
+             for i in range(rows)]
+        )
+    conn.close()
+
+
+def timed_reads(fn, count):
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - started)
+    return percentiles(latencies)
+
+
+def measure_format(template, workdir, name, rows, reads, seed):
+    from compression import ResponseCodec
+    from config import Config
+    from database import DatabaseManager, migrate
+
+    codec, _, dictionary = name.partition("+")
+    Config.RESPONSE_COMPRESSION = codec
+    Config.RESPONSE_COMPRESSION_DICTIONARY = bool(dictionary)
+    path = os.path.join(workdir, f"{name.replace('+', '-')}.db")
+    shutil.copy(template, path)
+    migrate(path)  # Switches the FTS triggers to decompress once a codec is set
+
+    started = time.perf_counter()
+    rewritten = ResponseCodec(path).recompress(pause=0)
+    recompress_seconds = time.perf_counter() - started
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    stored = conn.execute("SELECT SUM(length(response)) FROM conversations").fetchone()[0]
+    conn.close()
+
+    rng = random.Random(seed)
+    db = DatabaseManager(path)
+    results = {
+        "rows_rewritten": rewritten,
+        "recompress_s": round(recompress_seconds, 2),
+        "db_mib": round(os.path.getsize(path) / 2 ** 20, 1),
+        "response_mib": round(stored / 2 ** 20, 1),
+        "get_by_id": timed_reads(lambda i: db.get_conversation_by_id(rng.randint(1, rows)), reads),
+        "search": timed_reads(lambda i: db.search_conversations(rng.choice(TOPICS)), reads),
+        "recent_page": timed_reads(lambda i: db.get_recent_conversations(limit=6), reads),
+    }
+    db.close_all()
+    return results
+
+
+def measure(rows=5000, reads=500, formats=FORMATS, seed=0):
+    workdir = tempfile.mkdtemp(prefix="hermes-bench-compression-")
+    template = os.path.join(workdir, "template.db")
+    seed_template(template, rows, seed)
+    summary = {"rows": rows, "formats": {}}
+    for name in formats:
+        summary["formats"][name] = measure_format(template, workdir, name, rows, reads, seed)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--reads", type=int, default=500, help="Reads timed per kind and format")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = measure(args.rows, args.reads, args.formats)
+    if args.json:
+        print(json.dumps(summary))
+        return
+    print(f"rows: {summary['rows']}")
+    for name, row in summary["formats"].items():
+        print(f"{name:<10} db {row['db_mib']:>7.1f} MiB  responses {row['response_mib']:>7.1f} MiB  "
+              f"recompress {row['recompress_s']:>6.2f} s  "
+              f"get p50 {row['get_by_id']['p50_ms']:.3f} ms  "
+              f"search p50 {row['search']['p50_ms']:.2f} ms  "
+              f"page p50 {row['recent_page']['p50_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
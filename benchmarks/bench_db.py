@@ -0,0 +1,114 @@
+"""DatabaseManager operation rates at growing table sizes.
+
+Seeds a scratch database per size through the real migrations and
+triggers, then times the operations the GUI performs: saves, likes,
+history pages, lookups, full-text search and session windows.
+
+    python benchmarks/bench_db.py --sizes 10000 100000 1000000
+    python benchmarks/bench_db.py --sizes 10000 --ops 500 --json
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import fake_text, percentiles
+
+TOPICS = ["microplastics", "crispr", "fusion", "glaciers", "sleep", "vaccines", "lithium", "coral"]
+
+
+def seed_database(path, rows, batch=10000):
+    from compression import register_functions
+    from database import migrate
+
+    migrate(path)
+    conn = sqlite3.connect(path)
+    # The full-text triggers read responses through hermes_decompress()
+    register_functions(conn, path)
+    now = int(time.time())
+    for start in range(0, rows, batch):
+        conn.executemany(
+            "INSERT INTO conversations (query, response, timestamp, model_used) VALUES (?, ?, ?, 'bench')",
+            [
+                (f"{TOPICS[i % len(TOPICS)]} question {i}", fake_text(str(i), words=60), now - rows + i)
+                for i in range(start, min(rows, start + batch))
+            ]
+        )
+        conn.commit()
+    conn.close()
+
+
+def timed_ops(fn, count):
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        op_started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - op_started)
+    elapsed = time.perf_counter() - started
+    return {"ops_per_s": round(count / elapsed, 1), **percentiles(latencies)}
+
+
+def measure_size(rows, ops, rng):
+    from database import DatabaseManager
+
+    path = os.path.join(tempfile.mkdtemp(prefix="hermes-bench-db-"), "bench.db")
+    started = time.perf_counter()
+    seed_database(path, rows)
+    seed_seconds = time.perf_counter() - started
+
+    db = DatabaseManager(path)
+    session_id = db.create_session("bench", "long session")
+    for i in range(300):
+        db.append_exchange(session_id, f"turn {i}", fake_text(f"turn {i}"), None, "bench")
+
+    results = {
+        "save_conversation": timed_ops(lambda i: db.save_conversation(f"new {i}", "response", "bench"), ops),
+        "update_likes": timed_ops(lambda i: db.update_likes(rng.randint(1, rows)), ops),
+        "likes_flush": timed_ops(lambda i: db.writes.flush(), 1),
+        "recent_page": timed_ops(lambda i: db.get_recent_conversations(limit=6), ops),
+        "keyset_page": timed_ops(lambda i: db.get_recent_conversations(limit=6, before=rng.randint(1, rows)), ops),
+        "get_by_id": timed_ops(lambda i: db.get_conversation_by_id(rng.randint(1, rows)), ops),
+        "search": timed_ops(lambda i: db.search_conversations(rng.choice(TOPICS)), ops),
+        "session_window": timed_ops(lambda i: db.get_session_messages(session_id, limit=21), ops),
+    }
+    db.close_all()
+    return {
+        "rows": rows,
+        "seed_s": round(seed_seconds, 2),
+        "db_mib": round(os.path.getsize(path) / 2 ** 20, 1),
+        "ops": results,
+    }
+
+
+def measure(sizes=(10000, 100000, 1000000), ops=200, seed=0):
+    rng = random.Random(seed)
+    return [measure_size(rows, ops, rng) for rows in sizes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--ops", type=int, default=200, help="Operations timed per kind and size")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = measure(args.sizes, args.ops)
+    if args.json:
+        print(json.dumps(summary))
+        return
+    for size in summary:
+        print(f"rows: {size['rows']}  seeded in {size['seed_s']} s  ({size['db_mib']} MiB)")
+        for name, result in size["ops"].items():
+            print(f"  {name:<18} {result['ops_per_s']:>10.1f} ops/s  "
+                  f"p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""End-to-end latency of handle_user_input through the real Streamlit script.
+
+Runs gui.py headless with streamlit.testing's AppTest, logged in, with
+Gemini, LangChain's chat model, search and embeddings replaced by the
+fakes in benchmarks/fakes.py. Each chat submission is one full script
+rerun: cache lookup, generation, persistence, session bookkeeping and
+sidebar render.
+
+    python benchmarks/bench_e2e.py --prompts 20
+    python benchmarks/bench_e2e.py --llm-latency lognormal:0.8:0.4 --json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import install, percentiles
+
+TOPICS = ["microplastics in oceans", "crispr off-target effects", "fusion energy timelines",
+          "glacier retreat", "sleep and memory"]
+MODES = ["standard", "sources", "cached"]
+
+
+def run_mode(mode, prompts):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "gui.py"), default_timeout=300)
+    at.session_state["logged_in"] = True
+    at.session_state["username"] = f"bench-{mode}"
+    at.session_state["use_sources"] = mode == "sources"
+    at.run()
+
+    queries = [f"{TOPICS[i % len(TOPICS)]} {i}" for i in range(prompts)]
+    if mode == "cached":
+        # Ask everything once so the timed pass is served by the semantic cache
+        for query in queries:
+            at.chat_input[0].set_value(query).run()
+
+    latencies, errors = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        at.chat_input[0].set_value(query).run()
+        latencies.append(time.perf_counter() - started)
+        errors += len(at.exception) + len(at.error)
+    return {"prompts": prompts, "errors": errors, **percentiles(latencies)}
+
+
+def measure(prompts=20, llm_latency="lognormal:0.5:0.4", search_latency="lognormal:0.3:0.3", modes=MODES):
+    # AppTest touches session state outside a script run, which Streamlit warns about
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    os.chdir(tempfile.mkdtemp(prefix="hermes-bench-e2e-"))
+    install(llm_latency=llm_latency, search_latency=search_latency)
+
+    from config import Config
+    # Page indexing would download a HuggingFace model; keep the run offline
+    Config.RAG_ENABLED = False
+    # Cached answers normally need a like before they are reused
+    Config.SEMANTIC_CACHE_MIN_LIKES = 0
+
+    summary = {"llm_latency": llm_latency, "search_latency": search_latency, "modes": {}}
+    for mode in modes:
+        summary["modes"][mode] = run_mode(mode, prompts)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=20)
+    parser.add_argument("--llm-latency", default="lognormal:0.5:0.4", help="Fake Gemini latency spec")
+    parser.add_argument("--search-latency", default="lognormal:0.3:0.3", help="Fake search latency spec")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = measure(args.prompts, args.llm_latency, args.search_latency, args.modes)
+    if args.json:
+        print(json.dumps(summary))
+        return
+    for mode, row in summary["modes"].items():
+        print(f"{mode:<9} prompts: {row['prompts']}  errors: {row['errors']}  "
+              f"p50 {row['p50_ms']:.0f} ms  p90 {row['p90_ms']:.0f} ms  p99 {row['p99_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
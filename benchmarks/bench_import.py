@@ -0,0 +1,83 @@
+"""Import-time budget for the Streamlit entry point.
+
+Imports a module in a fresh interpreter under `python -X importtime`,
+repeats it a few times and keeps the fastest run. Fails (exit status 1)
+when the cumulative import time exceeds the budget, or when any heavy
+subsystem that should load lazily is pulled in at import time.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --module api --budget-ms 1500 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only loaded on first use (or by the warm-up thread after login)
+LAZY = [
+    "langchain", "langchain_community", "langchain_google_genai", "google.generativeai",
+    "faiss", "reportlab", "PIL", "markdown", "nltk",
+]
+
+
+def import_profile(module):
+    """{module: cumulative microseconds} for one cold import of `module`"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    profile = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def measure(module="gui", runs=3, top=10):
+    profiles = [import_profile(module) for _ in range(runs)]
+    best = min(profiles, key=lambda profile: profile[module])
+    loaded = sorted(
+        name for name in LAZY
+        if any(imported == name or imported.startswith(name + ".") for imported in best)
+    )
+    slowest = sorted(best.items(), key=lambda item: item[1], reverse=True)[1:top + 1]
+    return {
+        "module": module,
+        "import_ms": round(best[module] / 1000, 1),
+        "eager_heavy_modules": loaded,
+        "slowest": [{"module": name, "ms": round(us / 1000, 1)} for name, us in slowest],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="gui")
+    parser.add_argument("--runs", type=int, default=3, help="Cold imports; the fastest is reported")
+    parser.add_argument("--budget-ms", type=float, default=1000,
+                        help="Largest acceptable cumulative import time (streamlit alone is ~400 ms)")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = measure(args.module, args.runs)
+    summary["budget_ms"] = args.budget_ms
+    summary["ok"] = summary["import_ms"] <= args.budget_ms and not summary["eager_heavy_modules"]
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print(f"import {summary['module']}: {summary['import_ms']:.0f} ms (budget {args.budget_ms:.0f} ms)")
+        for row in summary["slowest"]:
+            print(f"  {row['module']:<60} {row['ms']:>8.1f} ms")
+        if summary["eager_heavy_modules"]:
+            print(f"loaded eagerly: {', '.join(summary['eager_heavy_modules'])}")
+    sys.exit(0 if summary["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark for exporting conversations to PDF, by message count.
+
+For each size, times a cold export (every message rendered from markdown),
+a warm one (messages served from the rendered-paragraph cache) and the
+background exporter's result cache, on a synthetic conversation.
+
+    python benchmarks/bench_pdf.py --messages 500
+    python benchmarks/bench_pdf.py --messages 50 100 250 500 --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MESSAGE = (
+    "## Findings\n\n"
+    "Recent studies report **significant** effects, with *moderate* confidence "
+    "([source](https://example.com/paper)).\n\n"
+    "- First point with supporting detail\n"
+    "- Second point with supporting detail\n\n"
+)
+
+
+def build_messages(count):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}\n\n" + MESSAGE * 3}
+        for i in range(count)
+    ]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def measure(counts=(500,)):
+    """Export timings per message count, JSON-ready"""
+    import pdf
+    from pdf import PdfExporter, export_conversation_to_pdf
+
+    summary = []
+    for count in counts:
+        messages = build_messages(count)
+        pdf._flowables.clear()
+        pdf_data, cold = timed(lambda: export_conversation_to_pdf(messages))
+        _, warm = timed(lambda: export_conversation_to_pdf(messages))
+
+        exporter = PdfExporter(workers=1)
+        _, submitted = timed(lambda: exporter.submit(messages))
+        _, built = timed(lambda: exporter.submit(messages).result())
+        _, repeat = timed(lambda: exporter.submit(messages).result())
+        summary.append({
+            "messages": count,
+            "pdf_kib": round(len(pdf_data) / 1024, 1),
+            "cold_ms": round(cold * 1000, 1),
+            "warm_ms": round(warm * 1000, 1),
+            "submit_ms": round(submitted * 1000, 3),
+            "build_wait_ms": round(built * 1000, 1),
+            "repeat_ms": round(repeat * 1000, 3),
+        })
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, nargs="+", default=[500])
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = measure(args.messages)
+    if args.json:
+        print(json.dumps(summary))
+        return
+    for row in summary:
+        print(f"messages: {row['messages']}  pdf size: {row['pdf_kib']:.0f} KiB")
+        print(f"cold export: {row['cold_ms']:.0f} ms  warm export: {row['warm_ms']:.0f} ms")
+        print(f"background submit: {row['submit_ms']:.2f} ms  "
+              f"build wait: {row['build_wait_ms']:.0f} ms  repeat export: {row['repeat_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
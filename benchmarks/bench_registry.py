@@ -0,0 +1,134 @@
+"""Model registry failover and hedging under simulated Gemini latency and errors.
+
+Drives ModelRegistry with fake clients from benchmarks/fakes.py:
+
+* failover: the primary model fails at a given rate; reports end-to-end
+  latency and how quickly the circuit breaker stops calling it.
+* hedging: the primary has a slow tail; compares plain generate() with
+  generate_hedged() on the same latency distributions.
+
+    python benchmarks/bench_registry.py --calls 400
+    python benchmarks/bench_registry.py --tail 0.05:1.0 --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import fake_client_factory, percentiles
+
+
+def bench_config(**overrides):
+    from config import Config
+    return type("BenchConfig", (Config,), overrides)
+
+
+def drive(call, calls, concurrency):
+    """Run call() `calls` times; returns (latencies, errors, elapsed)"""
+    latencies, errors = [], []
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            errors.append(str(e))
+            return
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(calls)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def failover(calls, concurrency, latency, failure_rate):
+    from model_registry import ModelRegistry
+
+    config = bench_config(CIRCUIT_RESET_TIMEOUT=3600)
+    registry = ModelRegistry(
+        client_factory=fake_client_factory(failure_rates={config.MODEL_NAMES[0]: failure_rate},
+                                           default_latency=latency),
+        config=config
+    )
+    latencies, errors, elapsed = drive(lambda: registry.generate("failover prompt"), calls, concurrency)
+    primary = registry.get_client(config.MODEL_NAMES[0])
+    return {
+        "failure_rate": failure_rate,
+        "calls": calls,
+        "errors": len(errors),
+        "throughput_rps": round(calls / elapsed, 1),
+        "primary_calls": primary.calls,
+        "primary_breaker": registry.breaker(config.MODEL_NAMES[0]).state,
+        **percentiles(latencies),
+    }
+
+
+def hedging(calls, concurrency, latency, tail, hedge_percentile):
+    from model_registry import ModelRegistry
+
+    config = bench_config(HEDGE_PERCENTILE=hedge_percentile, HEDGE_MIN_SAMPLES=20)
+    primary_latency = f"{latency},tail={tail}"
+    results = {"latency": latency, "primary_tail": tail, "hedge_percentile": hedge_percentile}
+    for name, hedged in (("plain", False), ("hedged", True)):
+        registry = ModelRegistry(
+            client_factory=fake_client_factory(latencies={config.MODEL_NAMES[0]: primary_latency},
+                                               default_latency=latency),
+            config=config
+        )
+        call = registry.generate_hedged if hedged else registry.generate
+        # Warm the latency window so hedges fire at the percentile, not the default delay
+        drive(lambda: call("warm-up prompt"), config.HEDGE_MIN_SAMPLES, concurrency)
+        latencies, errors, elapsed = drive(lambda: call("hedging prompt"), calls, concurrency)
+        results[name] = {
+            "errors": len(errors),
+            "throughput_rps": round(calls / elapsed, 1),
+            **percentiles(latencies),
+        }
+        if hedged:
+            results[name]["hedge_stats"] = dict(registry.hedge_stats)
+    return results
+
+
+def measure(calls=400, concurrency=8, latency="lognormal:0.05:0.3", failure_rates=(0.3, 1.0),
+            tail="0.05:1.0", hedge_percentile=90):
+    return {
+        "failover": [failover(calls, concurrency, latency, rate) for rate in failure_rates],
+        "hedging": hedging(calls, concurrency, latency, tail, hedge_percentile),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", default="lognormal:0.05:0.3", help="Fake Gemini latency spec")
+    parser.add_argument("--failure-rates", type=float, nargs="+", default=[0.3, 1.0])
+    parser.add_argument("--tail", default="0.05:1.0", help="Primary slow tail as <probability>:<seconds>")
+    parser.add_argument("--hedge-percentile", type=float, default=90,
+                        help="Keep under 100 minus the tail percentage so hedges fire before the tail")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = measure(args.calls, args.concurrency, args.latency, args.failure_rates,
+                      args.tail, args.hedge_percentile)
+    if args.json:
+        print(json.dumps(summary))
+        return
+    for row in summary["failover"]:
+        print(f"failover @ {row['failure_rate']:.0%} primary errors: {row['errors']} failed calls, "
+              f"primary called {row['primary_calls']}x (breaker {row['primary_breaker']}), "
+              f"p50 {row['p50_ms']:.1f} ms  p99 {row['p99_ms']:.1f} ms")
+    hedging_summary = summary["hedging"]
+    for name in ("plain", "hedged"):
+        row = hedging_summary[name]
+        print(f"{name:<7} p50 {row['p50_ms']:.1f} ms  p90 {row['p90_ms']:.1f} ms  p99 {row['p99_ms']:.1f} ms")
+    print(f"hedge stats: {hedging_summary['hedged']['hedge_stats']}")
+
+
+if __name__ == "__main__":
+    main()
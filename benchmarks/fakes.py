@@ -0,0 +1,232 @@
+"""Deterministic offline stand-ins for Gemini, LangChain's Gemini chat model and web search.
+
+Every fake draws its latency from a seeded Latency distribution, so a run
+with the same arguments does the same amount of (simulated) waiting.
+install() swaps them into the app's extension points: the model
+registry's client factory, ResearchAgent's chat model and search backend,
+and the semantic cache's embedding function.
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+LOREM = (
+    "Researchers report consistent effects across cohorts. Evidence from recent studies "
+    "suggests moderate confidence, with open questions about long-term outcomes and "
+    "measurement. Further work should replicate findings in larger, more diverse samples. "
+).split()
+
+
+class Latency:
+    """Seeded latency distribution in seconds.
+
+    Spec strings: "constant:0.05", "uniform:0.02:0.08" or
+    "lognormal:<median>:<sigma>". A spec may end with
+    ",tail=<probability>:<seconds>" to add a slow tail.
+    """
+
+    def __init__(self, spec="constant:0", seed=0):
+        self.spec = spec
+        body, _, tail = spec.partition(",tail=")
+        parts = body.split(":")
+        self.kind = parts[0]
+        self.params = [float(p) for p in parts[1:]]
+        self.tail = tuple(float(p) for p in tail.split(":")) if tail else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            if self.tail and self._random.random() < self.tail[0]:
+                return self.tail[1]
+            if self.kind == "constant":
+                return self.params[0]
+            if self.kind == "uniform":
+                return self._random.uniform(self.params[0], self.params[1])
+            if self.kind == "lognormal":
+                return self.params[0] * math.exp(self._random.gauss(0, self.params[1]))
+        raise ValueError(f"Unknown latency distribution: {self.spec}")
+
+    def sleep(self):
+        time.sleep(self.sample())
+
+
+def fake_text(prompt, words=120):
+    """Deterministic markdown-ish answer derived from the prompt"""
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    body = " ".join(rng.choice(LOREM) for _ in range(words))
+    return f"## Key Findings\n\n- {body[:200]}\n\n## Relevant Studies\n\n{body}"
+
+
+def fake_usage(prompt, text):
+    """Gemini-style usage_metadata, counting words as tokens"""
+    prompt_tokens, output_tokens = len(str(prompt).split()), len(text.split())
+    return SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+                           total_token_count=prompt_tokens + output_tokens)
+
+
+class _Chunk:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.parts = [text] if text else []
+        self.usage_metadata = usage_metadata
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel: generate_content with and without stream=True"""
+
+    def __init__(self, model_name, latency=None, failure_rate=0.0, chunks=8, chunk_latency=None, seed=0):
+        self.model_name = model_name
+        self.latency = latency or Latency()
+        self.chunk_latency = chunk_latency or Latency()
+        self.failure_rate = failure_rate
+        self.chunks = chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _should_fail(self):
+        with self._lock:
+            self.calls += 1
+            return self._random.random() < self.failure_rate
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        fail = self._should_fail()
+        self.latency.sleep()
+        if fail:
+            raise RuntimeError(f"{self.model_name}: simulated 503")
+        text = fake_text(str(prompt))
+        if not stream:
+            return _Chunk(text, fake_usage(prompt, text))
+        return self._stream(prompt, text)
+
+    def _stream(self, prompt, text):
+        size = max(1, len(text) // self.chunks)
+        for start in range(0, len(text), size):
+            if start:
+                self.chunk_latency.sleep()
+            last = start + size >= len(text)
+            yield _Chunk(text[start:start + size], fake_usage(prompt, text) if last else None)
+
+
+def fake_client_factory(latencies=None, failure_rates=None, default_latency="constant:0", seed=0):
+    """Client factory for ModelRegistry with per-model latency specs and failure rates"""
+    latencies = latencies or {}
+    failure_rates = failure_rates or {}
+
+    def factory(model_name):
+        return FakeGenerativeModel(
+            model_name,
+            latency=Latency(latencies.get(model_name, default_latency), seed=seed),
+            failure_rate=failure_rates.get(model_name, 0.0),
+            seed=seed
+        )
+    return factory
+
+
+class FakeChatModel(BaseChatModel):
+    """Stands in for ChatGoogleGenerativeAI in ResearchAgent.
+
+    Answers query-planning prompts with one query per line, agent prompts
+    with a "Final Answer" action and everything else with fake_text.
+    """
+
+    latency: Any = None
+    model: str = "fake-chat"
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        if self.latency is not None:
+            self.latency.sleep()
+        if "one query per line" in prompt:
+            topic = prompt.rsplit("Topic:", 1)[-1].strip()
+            content = "\n".join(f"{topic} {aspect}" for aspect in ("findings", "studies", "challenges", "outlook"))
+        elif "RESPONSE FORMAT INSTRUCTIONS" in prompt:
+            content = "```json\n" + json.dumps({"action": "Final Answer", "action_input": fake_text(prompt)}) + "\n```"
+        else:
+            content = fake_text(prompt)
+        prompt_tokens, output_tokens = len(prompt.split()), len(content.split())
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": prompt_tokens, "output_tokens": output_tokens,
+            "total_tokens": prompt_tokens + output_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def chat_model_factory(latency=None):
+    """Replacement for the ChatGoogleGenerativeAI constructor"""
+    def factory(**kwargs):
+        return FakeChatModel(latency=latency, model=kwargs.get("model", "fake-chat"))
+    return factory
+
+
+class FakeSearchBackend:
+    """Stands in for DuckDuckGoSearchAPIWrapper: results(query, max_results)"""
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+
+    def results(self, query, max_results=5):
+        self.latency.sleep()
+        slug = hashlib.sha256(query.encode("utf-8")).hexdigest()[:10]
+        return [
+            {
+                "title": f"{query.title()} ({i})",
+                "link": f"https://example.org/{slug}/{i}",
+                "snippet": fake_text(f"{query} {i}", words=30),
+            }
+            for i in range(max_results)
+        ]
+
+    def run(self, query):
+        return "\n".join(result["snippet"] for result in self.results(query))
+
+
+def fake_embed(model_name, text, dimensions=256):
+    """Hashed bag-of-words vector standing in for Gemini embeddings"""
+    vector = [0.0] * dimensions
+    for word in text.lower().split():
+        vector[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % dimensions] += 1.0
+    return tuple(vector)
+
+
+def install(llm_latency="constant:0", search_latency="constant:0", failure_rates=None,
+            model_latencies=None, seed=0):
+    """Point every live backend at the fakes; returns the fake-backed registry"""
+    import model_registry
+    import research_agent
+    import semantic_cache
+
+    registry = model_registry.ModelRegistry(
+        client_factory=fake_client_factory(model_latencies, failure_rates, llm_latency, seed)
+    )
+    model_registry._registry = registry
+    research_agent.ChatGoogleGenerativeAI = chat_model_factory(Latency(llm_latency, seed=seed))
+    research_agent.DuckDuckGoSearchAPIWrapper = lambda: FakeSearchBackend(Latency(search_latency, seed=seed))
+    semantic_cache._embed = fake_embed
+    return registry
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    """Latency percentiles in milliseconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {
+        f"p{point}_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))] * 1000, 3)
+        for point in points
+    }
@@ -0,0 +1,121 @@
+"""Run every offline benchmark and write one JSON report.
+
+Each benchmark runs in its own subprocess (they chdir into scratch
+directories and install fakes), and its --json summary is collected
+under the benchmark's name together with run metadata. Pass --compare
+with an earlier report to print the change of every shared metric.
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py --quick --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BENCHMARKS = {
+    "api": ["bench_api.py", "--llm-latency", "lognormal:0.2:0.4"],
+    "db": ["bench_db.py"],
+    "pdf": ["bench_pdf.py", "--messages", "50", "100", "250", "500"],
+    "registry": ["bench_registry.py"],
+    "e2e": ["bench_e2e.py"],
+    "import": ["bench_import.py"],
+    "compression": ["bench_compression.py"],
+}
+
+QUICK = {
+    "api": ["--requests", "500"],
+    "db": ["--sizes", "10000", "--ops", "100"],
+    "pdf": ["--messages", "50", "100"],
+    "registry": ["--calls", "100"],
+    "e2e": ["--prompts", "5", "--llm-latency", "constant:0.05", "--search-latency", "constant:0.02"],
+    "import": ["--runs", "1"],
+    "compression": ["--rows", "1000", "--reads", "100", "--formats", "none", "zlib", "zstd"],
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(name, quick):
+    command = [sys.executable, os.path.join(HERE, BENCHMARKS[name][0])] + BENCHMARKS[name][1:]
+    if quick:
+        command += QUICK[name]
+    command.append("--json")
+    started = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True)
+    elapsed = round(time.perf_counter() - started, 1)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1:], "wall_s": elapsed}
+    # The summary is the last line; anything before it is incidental output
+    return {"result": json.loads(completed.stdout.strip().splitlines()[-1]), "wall_s": elapsed}
+
+
+def flatten(value, prefix=""):
+    """{dotted.path: number} for every numeric leaf"""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((str(i), item) for i, item in enumerate(value))
+    else:
+        return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+    flat = {}
+    for key, item in items:
+        flat.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+    return flat
+
+
+def compare(previous, current):
+    before, after = flatten(previous["benchmarks"]), flatten(current["benchmarks"])
+    for key in sorted(before.keys() & after.keys()):
+        if before[key]:
+            change = (after[key] - before[key]) / abs(before[key]) * 100
+            print(f"{key:<60} {before[key]:>12g} -> {after[key]:<12g} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--quick", action="store_true", help="Smaller workloads for a fast smoke run")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/<UTC timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier report to diff against")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    report = {
+        "started_at": now.isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "benchmarks": {},
+    }
+    for name in args.only or BENCHMARKS:
+        print(f"running {name}...", file=sys.stderr)
+        report["benchmarks"][name] = run_benchmark(name, args.quick)
+
+    output = args.output or os.path.join(HERE, "results", now.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from config import Config
+
+# Compressed responses are BLOBs starting with this header; plain responses stay TEXT
+HEADER = struct.Struct(">2sBI")  # magic, codec id, dictionary id (0 = none)
+MAGIC = b"HZ"
+CODEC_IDS = {"zlib": 1, "zstd": 2}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+DEFAULT_LEVELS = {"zlib": 6, "zstd": 3}
+
+_codecs = {}
+_codecs_lock = threading.Lock()
+_recompressing = set()
+
+
+def get_response_codec(db_name='research_chat.db'):
+    """Return the process-wide response codec for a database"""
+    with _codecs_lock:
+        if db_name not in _codecs:
+            _codecs[db_name] = ResponseCodec(db_name)
+        return _codecs[db_name]
+
+
+def register_functions(conn, db_name):
+    """Add hermes_decompress(), which the FTS view and triggers rely on, to a connection"""
+    get_response_codec(db_name).register(conn)
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd response compression needs the zstandard package")
+    return zstandard
+
+
+def train_zlib_dictionary(samples, size):
+    """Preset dictionary of the lines shared by several samples, most common last"""
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(line for line in sample.splitlines() if line.strip()))
+    # zlib finds matches fastest near the end of the window
+    common = [line for line, count in sorted(counts.items(), key=lambda item: item[1]) if count > 1]
+    return "\n".join(common).encode("utf-8")[-size:]
+
+
+class ResponseCodec:
+    """Compresses conversation responses for storage and restores them on read.
+
+    Values that aren't BLOBs pass through untouched, so plain and
+    compressed rows can live side by side while the background
+    recompression works through a table.
+    """
+
+    def __init__(self, db_name='research_chat.db', codec=None, level=None):
+        self.db_name = db_name
+        codec = codec or Config.RESPONSE_COMPRESSION
+        if codec != "none" and codec not in CODEC_IDS:
+            raise ValueError(f"Unknown response compression {codec!r}")
+        self.codec = None if codec == "none" else codec
+        self.level = level or Config.RESPONSE_COMPRESSION_LEVEL or DEFAULT_LEVELS.get(self.codec)
+        self._dictionaries = {}  # id -> bytes
+        self._active = None  # (dictionary id, bytes) used for new writes, once loaded
+        self._lock = threading.Lock()
+        self._local = threading.local()  # zstd (de)compressors aren't thread-safe
+
+    def register(self, conn):
+        conn.create_function("hermes_decompress", 1, self.decode, deterministic=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name)
+        conn.execute(f"PRAGMA busy_timeout = {int(Config.DB_BUSY_TIMEOUT_MS)}")
+        return conn
+
+    def _dictionary(self, dictionary_id):
+        with self._lock:
+            data = self._dictionaries.get(dictionary_id)
+        if data is None:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT data FROM compression_dictionaries WHERE id = ?", (dictionary_id,)
+                ).fetchone()
+            finally:
+                conn.close()
+            if row is None:
+                raise ValueError(f"Compression dictionary {dictionary_id} is missing")
+            data = row[0]
+            with self._lock:
+                self._dictionaries[dictionary_id] = data
+        return data
+
+    def active_dictionary(self):
+        """(id, bytes) of the newest dictionary for this codec, or (0, None)"""
+        with self._lock:
+            active = self._active
+        if active is None:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT id, data FROM compression_dictionaries WHERE codec = ? ORDER BY id DESC LIMIT 1",
+                    (self.codec,)
+                ).fetchone()
+            finally:
+                conn.close()
+            active = tuple(row) if row else (0, None)
+            with self._lock:
+                self._active = active
+                if row:
+                    self._dictionaries[row[0]] = row[1]
+        return active
+
+    def _zstd_context(self, kind, dictionary_id, dictionary):
+        """Per-thread zstd compressor or decompressor, reused since loading a dictionary is costly"""
+        contexts = self._local.__dict__.setdefault(kind, {})
+        context = contexts.get(dictionary_id)
+        if context is None:
+            zstandard = _zstd()
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            if kind == "compress":
+                context = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+            else:
+                context = zstandard.ZstdDecompressor(dict_data=dict_data)
+            contexts[dictionary_id] = context
+        return context
+
+    def header(self):
+        """Header every up-to-date value starts with, or None when compression is off"""
+        if self.codec is None:
+            return None
+        return HEADER.pack(MAGIC, CODEC_IDS[self.codec], self.active_dictionary()[0])
+
+    def encode(self, text):
+        """Stored form of a response: a compressed BLOB, or the text itself"""
+        if self.codec is None or text is None:
+            return text
+        data = text.encode("utf-8")
+        if len(data) < Config.RESPONSE_COMPRESSION_MIN_BYTES:
+            return text
+        dictionary_id, dictionary = self.active_dictionary()
+        if self.codec == "zlib":
+            compressor = zlib.compressobj(self.level, zdict=dictionary) if dictionary else zlib.compressobj(self.level)
+            body = compressor.compress(data) + compressor.flush()
+        else:
+            body = self._zstd_context("compress", dictionary_id, dictionary).compress(data)
+        return HEADER.pack(MAGIC, CODEC_IDS[self.codec], dictionary_id) + body
+
+    def decode(self, value):
+        """Response text from its stored form"""
+        if not isinstance(value, bytes):
+            return value
+        if not value.startswith(MAGIC):
+            return value.decode("utf-8")
+        _, codec_id, dictionary_id = HEADER.unpack_from(value)
+        dictionary = self._dictionary(dictionary_id) if dictionary_id else None
+        body = value[HEADER.size:]
+        if CODEC_NAMES.get(codec_id) == "zlib":
+            decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            data = decompressor.decompress(body) + decompressor.flush()
+        elif CODEC_NAMES.get(codec_id) == "zstd":
+            data = self._zstd_context("decompress", dictionary_id, dictionary).decompress(body)
+        else:
+            raise ValueError(f"Unknown compression codec id {codec_id}")
+        return data.decode("utf-8")
+
+    def train_dictionary(self, samples=None, size=None):
+        """Train and store a dictionary from recent responses; returns its id, or None if too few"""
+        if self.codec is None:
+            return None
+        size = size or Config.RESPONSE_DICTIONARY_SIZE
+        conn = self._connect()
+        self.register(conn)
+        try:
+            texts = [row[0] for row in conn.execute(
+                "SELECT hermes_decompress(response) FROM conversations WHERE response IS NOT NULL "
+                "ORDER BY id DESC LIMIT ?",
+                (samples or Config.RESPONSE_DICTIONARY_SAMPLES,)
+            )]
+            if len(texts) < Config.RESPONSE_DICTIONARY_MIN_SAMPLES:
+                return None
+            if self.codec == "zlib":
+                data = train_zlib_dictionary(texts, min(size, 32 * 1024))  # zlib's window
+            else:
+                zstandard = _zstd()
+                data = zstandard.train_dictionary(size, [text.encode("utf-8") for text in texts]).as_bytes()
+            with conn:
+                dictionary_id = conn.execute(
+                    "INSERT INTO compression_dictionaries (codec, data, created_at) VALUES (?, ?, ?)",
+                    (self.codec, data, int(time.time()))
+                ).lastrowid
+        finally:
+            conn.close()
+        with self._lock:
+            self._dictionaries[dictionary_id] = data
+            self._active = (dictionary_id, data)
+        return dictionary_id
+
+    def recompress(self, batch_size=None, pause=None, stop=None):
+        """Bring every stored response to this codec's format, one batch per transaction.
+
+        Rows already in the current format are skipped in SQL, so an
+        interrupted run simply starts over. Returns the number of rows rewritten.
+        """
+        batch_size = batch_size or Config.RECOMPRESS_BATCH_SIZE
+        pause = Config.RECOMPRESS_PAUSE if pause is None else pause
+        if self.codec is not None and Config.RESPONSE_COMPRESSION_DICTIONARY and not self.active_dictionary()[0]:
+            try:
+                self.train_dictionary()
+            except Exception:
+                pass  # Compress without a dictionary rather than not at all
+        header = self.header()
+        if header is None:
+            stale = "typeof(response) = 'blob'"
+            params = ()
+        else:
+            stale = "(typeof(response) = 'text' AND length(CAST(response AS BLOB)) >= ?) " \
+                    "OR (typeof(response) = 'blob' AND substr(response, 1, ?) != ?)"
+            params = (Config.RESPONSE_COMPRESSION_MIN_BYTES, HEADER.size, header)
+
+        conn = self._connect()
+        self.register(conn)
+        rewritten, last_id = 0, 0
+        try:
+            if header is not None and not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'conversations_text'"
+            ).fetchone():
+                # The plain FTS triggers would index the compressed bytes
+                raise RuntimeError("Run migrate() with compression enabled before recompressing")
+            while stop is None or not stop.is_set():
+                rows = conn.execute(
+                    f"SELECT id, response FROM conversations WHERE id > ? AND ({stale}) ORDER BY id LIMIT ?",
+                    (last_id,) + params + (batch_size,)
+                ).fetchall()
+                if not rows:
+                    break
+                with conn:
+                    conn.executemany(
+                        "UPDATE conversations SET response = ? WHERE id = ?",
+                        [(self.encode(self.decode(value)), conv_id) for conv_id, value in rows]
+                    )
+                rewritten += len(rows)
+                last_id = rows[-1][0]
+                # Leave the write lock to the app between batches
+                time.sleep(pause)
+        finally:
+            conn.close()
+        return rewritten
+
+
+def start_background_recompression(db_name='research_chat.db'):
+    """Recompress existing responses on a daemon thread, once per process and database"""
+    if Config.RESPONSE_COMPRESSION == "none":
+        return
+    with _codecs_lock:
+        if db_name in _recompressing:
+            return
+        _recompressing.add(db_name)
+    codec = get_response_codec(db_name)
+    threading.Thread(target=codec.recompress, name="recompress", daemon=True).start()
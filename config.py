@@ -19,4 +19,132 @@ class Config:
         'gemini-1.5-flash',  # New recommended model (fast & affordable)
         'gemini-1.5-pro',    # Higher quality
         'gemini-pro'         # Fallback
-    ]
\ No newline at end of file
+    ]
+
+    # Semantic response cache
+    SEMANTIC_CACHE_ENABLED = True
+    SEMANTIC_CACHE_EMBEDDING_MODEL = 'models/text-embedding-004'
+    SEMANTIC_CACHE_THRESHOLD = 0.92   # Cosine similarity required for a hit
+    SEMANTIC_CACHE_TTL = 7 * 24 * 3600  # Seconds before a cached answer expires
+    SEMANTIC_CACHE_MAX_ENTRIES = 10000
+    SEMANTIC_CACHE_MIN_LIKES = 1      # Only serve answers users have liked (0 = any)
+
+    # Async database pool (api.py)
+    DB_POOL_SIZE = 4            # Read-only connections kept open
+    DB_BUSY_TIMEOUT_MS = 5000   # How long a connection waits on a locked database
+
+    # Sidebar conversation history
+    HISTORY_PAGE_SIZE = 5
+
+    # Shared model registry
+    MODEL_HEALTH_TTL = 600          # Seconds a health check result is reused
+    CIRCUIT_FAILURE_THRESHOLD = 3   # Consecutive failures before a model is skipped
+    CIRCUIT_RESET_TIMEOUT = 60      # Seconds before a failed model is retried
+
+    # Sourced research
+    RESEARCH_PARALLEL = True         # Plan sub-queries and search them concurrently
+    RESEARCH_SUBQUERIES = 4
+    RESEARCH_SEARCH_CONCURRENCY = 4
+    RESEARCH_RESULTS_PER_QUERY = 5
+
+    # Web search result cache
+    SEARCH_CACHE_ENABLED = True
+    SEARCH_CACHE_TTL = 24 * 3600     # Seconds before a cached search is refreshed
+    SEARCH_CACHE_MAX_ENTRIES = 5000  # Least recently used queries are evicted beyond this
+
+    # Local retrieval (RAG) over fetched source pages
+    RAG_ENABLED = True
+    RAG_INDEX_PATH = 'rag_index.faiss'
+    RAG_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+    RAG_EMBED_BATCH_SIZE = 64
+    RAG_CHUNK_SIZE = 1000
+    RAG_CHUNK_OVERLAP = 150
+    RAG_FETCH_CONCURRENCY = 8
+    RAG_FETCH_TIMEOUT = 8            # Seconds per page
+    RAG_MAX_PAGE_BYTES = 2_000_000
+    RAG_TOP_K = 8
+    RAG_MIN_SCORE = 0.45             # Cosine similarity for a chunk to count as relevant
+    RAG_MIN_LOCAL_CHUNKS = 4         # Answer from local vectors alone when this many match
+
+    # Research agent conversation memory
+    AGENT_MEMORY_MAX_TURNS = 6       # Most recent exchanges kept verbatim
+    AGENT_MEMORY_MAX_TOKENS = 2000   # Budget for verbatim turns before folding into the summary
+
+    # Batch research jobs (api.py)
+    JOB_WORKERS = 4
+    JOB_RATE_LIMIT_RPM = 15          # Requests per minute across all workers
+    JOB_RATE_BURST = 5
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RETRY_BASE_DELAY = 2         # Seconds, doubled on every retry
+    JOB_POLL_INTERVAL = 2            # Seconds between queue and progress checks
+
+    # Hedged requests across MODEL_NAMES (opt-in)
+    HEDGING_ENABLED = False
+    HEDGE_PERCENTILE = 95            # Hedge once the primary exceeds this latency percentile
+    HEDGE_DEFAULT_DELAY = 4.0        # Seconds, used until HEDGE_MIN_SAMPLES latencies are known
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_LATENCY_WINDOW = 200       # Recent latencies kept per model
+    HEDGE_MAX_WORKERS = 16
+
+    # Query-complexity routing between fast and strong models
+    ROUTING_ENABLED = True
+    ROUTING_COMPLEXITY_THRESHOLD = 2.0
+    ROUTES = {
+        'simple': {'model': 'gemini-1.5-flash', 'max_output_tokens': 1024},
+        'complex': {'model': 'gemini-1.5-pro', 'max_output_tokens': 2000},
+    }
+
+    # Background PDF export
+    PDF_EXPORT_WORKERS = 2
+    PDF_FLOWABLE_CACHE_SIZE = 5000
+    PDF_RESULT_CACHE_SIZE = 16
+
+    # Write-behind queue for likes and conversation saves
+    WRITE_BEHIND_FLUSH_INTERVAL = 1.0     # Seconds between like flushes
+    WRITE_BEHIND_MAX_PENDING = 100        # Liked conversations that trigger an early flush
+    WRITE_BEHIND_FSYNC = False            # fsync the journal per write to also survive power loss
+    WRITE_BEHIND_MAX_ATTEMPTS = 3
+    WRITE_BEHIND_SAVE_TIMEOUT = 30.0      # Seconds a save waits for the writer thread
+    WRITE_BEHIND_BATCH_RETENTION = 7 * 24 * 3600  # Seconds applied batch ids are remembered
+
+    # Multi-turn sessions
+    CHAT_WINDOW_SIZE = 20            # Most recent messages rendered when a session opens
+    CHAT_PAGE_SIZE = 20              # Older messages paged in per "Load older" click
+    SESSION_LIST_SIZE = 5
+
+    # Sidebar history cache
+    HISTORY_CACHE_TTL = 300          # Seconds; only bounds staleness from other processes' writes
+
+    # Cold start
+    WARMUP_ENABLED = True            # Preload LangChain, FAISS and ReportLab in the background after login
+
+    # Compressed response storage
+    RESPONSE_COMPRESSION = "none"            # "none", "zlib" or "zstd" (needs the zstandard package)
+    RESPONSE_COMPRESSION_LEVEL = None        # None uses the codec's default
+    RESPONSE_COMPRESSION_MIN_BYTES = 512     # Shorter responses stay plain text
+    RESPONSE_COMPRESSION_DICTIONARY = True   # Train a shared dictionary from stored responses
+    RESPONSE_DICTIONARY_SIZE = 32 * 1024     # Bytes; zlib can use at most 32 KiB
+    RESPONSE_DICTIONARY_SAMPLES = 2000       # Most recent responses sampled for training
+    RESPONSE_DICTIONARY_MIN_SAMPLES = 50
+    RECOMPRESS_BATCH_SIZE = 500              # Rows rewritten per background transaction
+    RECOMPRESS_PAUSE = 0.05                  # Seconds between background batches
+
+    # Archive tiering and scheduled maintenance
+    ARCHIVE_ENABLED = False                  # Move old, never-liked conversations to an archive database
+    ARCHIVE_DB_NAME = None                   # Defaults to <database>_archive.db next to the database
+    ARCHIVE_AFTER_DAYS = 90
+    ARCHIVE_BATCH_SIZE = 500                 # Conversations moved per transaction
+    MAINTENANCE_ENABLED = True
+    MAINTENANCE_INTERVAL = 3600              # Seconds between runs; the first runs one interval after start
+    MAINTENANCE_VACUUM_PAGES = 2000          # Free pages returned to the filesystem per run
+    MAINTENANCE_CONVERT_AUTO_VACUUM = False  # One full VACUUM so an older file can vacuum incrementally
+    MAINTENANCE_ANALYSIS_LIMIT = 1000        # Rows ANALYZE samples per index
+    MAINTENANCE_CHECKPOINT_MODE = "TRUNCATE" # Also shrinks the WAL file; waits briefly for readers
+
+    # Bulk NDJSON export and import
+    EXPORT_BATCH_SIZE = 500          # Rows fetched and written to the response per chunk
+    IMPORT_BATCH_SIZE = 5000         # Rows inserted per transaction
+
+    # API response cache and conditional GETs
+    RESPONSE_CACHE_SIZE = 1000       # Serialized conversation payloads kept, least recently used dropped
+    RESPONSE_CACHE_TTL = 30          # Seconds; only bounds staleness from other processes' writes
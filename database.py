@@ -1,93 +1,598 @@
 import sqlite3
-from datetime import datetime
 import threading
+import time
+import events
+from archive import attach_archive, reserve_archived_ids
+from compression import register_functions, start_background_recompression
+from config import Config
+from maintenance import start_maintenance
+from metrics import traced
+
+def _migration_baseline(cursor):
+    """Create the conversations table, or bring a pre-migration one up to date"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='conversations'")
+    if cursor.fetchone():
+        # Check for missing columns
+        cursor.execute("PRAGMA table_info(conversations)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        if 'model_used' not in columns:
+            cursor.execute("ALTER TABLE conversations ADD COLUMN model_used TEXT")
+    else:
+        cursor.execute('''
+            CREATE TABLE conversations (
+                id INTEGER PRIMARY KEY,
+                query TEXT,
+                response TEXT,
+                timestamp DATETIME,
+                likes INTEGER DEFAULT 0,
+                model_used TEXT
+            )
+        ''')
+
+def _migration_epoch_timestamps(cursor):
+    """Convert mixed datetime strings to integer Unix epoch seconds"""
+    # str(datetime.now()) values carry microseconds and are local time;
+    # SQLite datetime('now') values have none and are already UTC.
+    cursor.execute('''
+        UPDATE conversations
+        SET timestamp = CASE
+            WHEN timestamp LIKE '%.%' THEN CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+            ELSE CAST(strftime('%s', timestamp) AS INTEGER)
+        END
+        WHERE typeof(timestamp) = 'text'
+    ''')
+
+def _migration_history_indexes(cursor):
+    """Index the newest-first history scan used by the sidebar and API"""
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_conversations_recent "
+        "ON conversations (timestamp DESC, id DESC, query)"
+    )
+
+def _migration_full_text_search(cursor):
+    """Add an FTS5 index over query/response kept in sync by triggers"""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+            query, response,
+            content='conversations', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+            INSERT INTO conversations_fts (rowid, query, response)
+            VALUES (new.id, new.query, new.response);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+            INSERT INTO conversations_fts (conversations_fts, rowid, query, response)
+            VALUES ('delete', old.id, old.query, old.response);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF query, response ON conversations BEGIN
+            INSERT INTO conversations_fts (conversations_fts, rowid, query, response)
+            VALUES ('delete', old.id, old.query, old.response);
+            INSERT INTO conversations_fts (rowid, query, response)
+            VALUES (new.id, new.query, new.response);
+        END
+    ''')
+    cursor.execute("INSERT INTO conversations_fts (conversations_fts) VALUES ('rebuild')")
+
+def _migration_search_cache(cursor):
+    """Store web search results keyed on normalized query text"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS search_cache (
+            key TEXT PRIMARY KEY,
+            results TEXT,
+            created_at REAL,
+            last_accessed REAL
+        )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_search_cache_last_accessed ON search_cache (last_accessed)"
+    )
+
+def _migration_document_chunks(cursor):
+    """Store chunked source pages whose vectors live in the FAISS index"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_chunks (
+            id INTEGER PRIMARY KEY,
+            url TEXT,
+            title TEXT,
+            content TEXT,
+            created_at REAL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_chunks_url ON document_chunks (url)")
+
+def _migration_agent_memory(cursor):
+    """Persist each user's research agent summary and recent turns"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS agent_memory (
+            username TEXT PRIMARY KEY,
+            summary TEXT,
+            messages TEXT,
+            updated_at REAL
+        )
+    ''')
+
+def _migration_batch_jobs(cursor):
+    """Queue tables for batch research jobs"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            status TEXT,
+            mode TEXT,
+            total INTEGER,
+            created_at INTEGER,
+            finished_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_items (
+            id INTEGER PRIMARY KEY,
+            job_id INTEGER REFERENCES jobs(id) ON DELETE CASCADE,
+            position INTEGER,
+            query TEXT,
+            status TEXT,
+            attempts INTEGER DEFAULT 0,
+            conversation_id INTEGER,
+            error TEXT,
+            updated_at INTEGER
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items (status, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_job_items_job ON job_items (job_id, position)")
+
+def _migration_routing_log(cursor):
+    """Log model routing decisions and latencies for offline evaluation"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS routing_log (
+            id INTEGER PRIMARY KEY,
+            route TEXT,
+            score REAL,
+            features TEXT,
+            model_requested TEXT,
+            model_used TEXT,
+            latency_ms REAL,
+            first_token_ms REAL,
+            created_at INTEGER
+        )
+    ''')
+
+def _migration_write_behind_batches(cursor):
+    """Record applied write-behind batches so journal replay is idempotent"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS write_behind_batches (
+            batch_id TEXT PRIMARY KEY,
+            applied_at INTEGER
+        )
+    ''')
+
+def _migration_sessions(cursor):
+    """Multi-turn sessions per user, with their messages in order"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY,
+            username TEXT,
+            title TEXT,
+            created_at INTEGER,
+            updated_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY,
+            session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+            role TEXT NOT NULL,
+            content TEXT,  -- NULL when the text is the linked conversation's query or response
+            conversation_id INTEGER REFERENCES conversations(id) ON DELETE CASCADE,
+            model_used TEXT,
+            created_at INTEGER
+        )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sessions_user_recent ON sessions (username, updated_at DESC)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id)")
+
+def _create_preview_triggers(cursor):
+    """Keep query_preview in step with query and cover the history listing with it"""
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_preview_insert AFTER INSERT ON conversations BEGIN
+            UPDATE conversations SET query_preview = substr(new.query, 1, 80) WHERE id = new.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_preview_update AFTER UPDATE OF query ON conversations BEGIN
+            UPDATE conversations SET query_preview = substr(new.query, 1, 80) WHERE id = new.id;
+        END
+    ''')
+    # Cover the history listing with the preview instead of the full query
+    cursor.execute("DROP INDEX IF EXISTS idx_conversations_recent")
+    cursor.execute(
+        "CREATE INDEX idx_conversations_recent ON conversations (timestamp DESC, id DESC, query_preview)"
+    )
+
+def _migration_query_preview(cursor):
+    """Store a short query preview so history lists never read full rows"""
+    cursor.execute("ALTER TABLE conversations ADD COLUMN query_preview TEXT")
+    cursor.execute("UPDATE conversations SET query_preview = substr(query, 1, 80)")
+    _create_preview_triggers(cursor)
+
+def _migration_token_usage(cursor):
+    """Gemini token counts per conversation, from response metadata"""
+    for column in ("prompt_tokens", "output_tokens", "total_tokens"):
+        cursor.execute(f"ALTER TABLE conversations ADD COLUMN {column} INTEGER")
+
+def install_fts(cursor, compressed):
+    """(Re)create the FTS index and its triggers, reading responses as stored or through hermes_decompress()"""
+    for trigger in ("insert", "delete", "update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS conversations_fts_{trigger}")
+    cursor.execute("DROP TABLE IF EXISTS conversations_fts")
+    cursor.execute("DROP VIEW IF EXISTS conversations_text")
+    if compressed:
+        # snippet() reads the content table, so FTS sees responses through this view
+        cursor.execute('''
+            CREATE VIEW conversations_text AS
+            SELECT id, query, hermes_decompress(response) AS response FROM conversations
+        ''')
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE conversations_fts USING fts5(
+            query, response,
+            content='{"conversations_text" if compressed else "conversations"}', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    ''')
+    new_response, old_response = (
+        ("hermes_decompress(new.response)", "hermes_decompress(old.response)") if compressed
+        else ("new.response", "old.response")
+    )
+    cursor.execute(f'''
+        CREATE TRIGGER conversations_fts_insert AFTER INSERT ON conversations BEGIN
+            INSERT INTO conversations_fts (rowid, query, response)
+            VALUES (new.id, new.query, {new_response});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER conversations_fts_delete AFTER DELETE ON conversations BEGIN
+            INSERT INTO conversations_fts (conversations_fts, rowid, query, response)
+            VALUES ('delete', old.id, old.query, {old_response});
+        END
+    ''')
+    # Recompressing a response rewrites the row but not its text; skip the reindex then
+    cursor.execute(f'''
+        CREATE TRIGGER conversations_fts_update AFTER UPDATE OF query, response ON conversations
+        WHEN old.query IS NOT new.query OR {old_response} IS NOT {new_response}
+        BEGIN
+            INSERT INTO conversations_fts (conversations_fts, rowid, query, response)
+            VALUES ('delete', old.id, old.query, {old_response});
+            INSERT INTO conversations_fts (rowid, query, response)
+            VALUES (new.id, new.query, {new_response});
+        END
+    ''')
+    cursor.execute("INSERT INTO conversations_fts (conversations_fts) VALUES ('rebuild')")
+
+def fts_compressed(cursor):
+    """Whether the FTS triggers read responses through hermes_decompress()"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'conversations_text'")
+    return cursor.fetchone() is not None
+
+def _migration_compressed_responses(cursor):
+    """Store shared compression dictionaries; migrate() switches FTS over once compression is enabled"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS compression_dictionaries (
+            id INTEGER PRIMARY KEY,
+            codec TEXT,
+            data BLOB,
+            created_at INTEGER
+        )
+    ''')
+
+def _migration_monotonic_ids(cursor):
+    """Rebuild conversations with AUTOINCREMENT so archived or deleted ids are never handed out again"""
+    # Runs with foreign keys off, so dropping the old table leaves session messages alone
+    compressed = fts_compressed(cursor)
+    cursor.execute("DROP VIEW IF EXISTS conversations_text")
+    cursor.execute('''
+        CREATE TABLE conversations_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            query TEXT,
+            response TEXT,
+            timestamp DATETIME,
+            likes INTEGER DEFAULT 0,
+            model_used TEXT,
+            query_preview TEXT,
+            prompt_tokens INTEGER,
+            output_tokens INTEGER,
+            total_tokens INTEGER
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO conversations_new
+            (id, query, response, timestamp, likes, model_used, query_preview, prompt_tokens, output_tokens, total_tokens)
+        SELECT id, query, response, timestamp, likes, model_used, query_preview, prompt_tokens, output_tokens, total_tokens
+        FROM conversations
+    ''')
+    cursor.execute("DROP TABLE conversations")
+    cursor.execute("ALTER TABLE conversations_new RENAME TO conversations")
+    _create_preview_triggers(cursor)
+    install_fts(cursor, compressed)
+
+def _migration_prompt_embeddings(cursor):
+    """Prompt vectors behind the semantic response cache"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prompt_embeddings (
+            conversation_id INTEGER PRIMARY KEY
+                REFERENCES conversations(id) ON DELETE CASCADE,
+            mode TEXT,
+            embedding BLOB,
+            created_at REAL
+        )
+    ''')
+
+# (version, migration) pairs, applied in order and tracked in PRAGMA user_version
+MIGRATIONS = [
+    (1, _migration_baseline),
+    (2, _migration_epoch_timestamps),
+    (3, _migration_history_indexes),
+    (4, _migration_full_text_search),
+    (5, _migration_search_cache),
+    (6, _migration_document_chunks),
+    (7, _migration_agent_memory),
+    (8, _migration_batch_jobs),
+    (9, _migration_routing_log),
+    (10, _migration_write_behind_batches),
+    (11, _migration_sessions),
+    (12, _migration_query_preview),
+    (13, _migration_token_usage),
+    (14, _migration_compressed_responses),
+    (15, _migration_monotonic_ids),
+    (16, _migration_prompt_embeddings),
+]
+
+# BM25-ranked search; matches in the query column weigh more than in the response
+SEARCH_SQL = """
+    SELECT rowid AS id,
+           highlight(conversations_fts, 0, '**', '**') AS query,
+           snippet(conversations_fts, 1, '**', '**', '…', 24) AS snippet,
+           bm25(conversations_fts, 5.0, 1.0) AS rank
+    FROM conversations_fts
+    WHERE conversations_fts MATCH ?
+    ORDER BY rank
+    LIMIT ?
+"""
+
+# Keyset condition for rows older than the `before` id. Once that row is deleted or
+# archived, its nearest older id stands in for its timestamp so paging carries on.
+BEFORE_SQL = """(timestamp, id) < (
+    coalesce((SELECT timestamp FROM conversations WHERE id = :before),
+             (SELECT timestamp FROM conversations WHERE id < :before ORDER BY id DESC LIMIT 1)),
+    :before
+)"""
+
+def build_fts_query(text):
+    """Turn free text into a safe FTS5 expression, prefix-matching the last word"""
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if not terms:
+        return None
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def run_migrations(conn):
+    """Apply every migration newer than the database's schema version; returns the version it started at"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {target}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    return version
+
+def migrate(db_name='research_chat.db'):
+    """Bring a database file up to the current schema version"""
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    register_functions(conn, db_name)
+    try:
+        if conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+            # Only a new, empty file can switch modes without a full VACUUM
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        version = run_migrations(conn)
+        # Once, when migration 15 adds AUTOINCREMENT: skip ids an older archive already holds.
+        # Each archive pass keeps the sequence ahead from then on.
+        if version < 15 and attach_archive(conn, db_name):
+            reserve_archived_ids(conn)
+            conn.execute("DETACH DATABASE archive")
+        if Config.RESPONSE_COMPRESSION != "none":
+            cursor = conn.cursor()
+            if not fts_compressed(cursor):
+                # Opt-in and one-way: compressed rows may outlive turning compression off again
+                try:
+                    cursor.execute("BEGIN")
+                    install_fts(cursor, compressed=True)
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+    finally:
+        conn.close()
 
 class DatabaseManager:
     def __init__(self, db_name='research_chat.db'):
         self.db_name = db_name
         self._local = threading.local()
         self._initialize_db()
+        # Imported here because write_behind builds on this module
+        from write_behind import get_write_behind
+        self.writes = get_write_behind(db_name)
+        start_background_recompression(db_name)
+        start_maintenance(db_name)
     
+    @traced("db.get_conversation_by_id")
     def get_conversation_by_id(self, conv_id):
-        """Get conversation by ID"""
+        """Get conversation by ID, from the archive if it has been moved there"""
         with self._get_connection() as conn:
-            return conn.execute(
-                "SELECT id, query, response FROM conversations WHERE id = ?",
+            row = conn.execute(
+                "SELECT id, query, hermes_decompress(response) FROM conversations WHERE id = ?",
                 (conv_id,)
             ).fetchone()
+            if row is None and self._local.archive:
+                row = conn.execute(
+                    "SELECT id, query, hermes_decompress(response) FROM archive.conversations WHERE id = ?",
+                    (conv_id,)
+                ).fetchone()
+            return row
 
     def _get_connection(self):
         if not hasattr(self._local, 'conn'):
             self._local.conn = sqlite3.connect(self.db_name)
             self._local.conn.execute("PRAGMA foreign_keys = ON")
+            register_functions(self._local.conn, self.db_name)
+            self._local.archive = attach_archive(self._local.conn, self.db_name)
         return self._local.conn
         
     def _initialize_db(self):
         """Initialize database with schema migration support"""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Check if table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='conversations'")
-            table_exists = cursor.fetchone()
-            
-            if table_exists:
-                # Check for missing columns
-                cursor.execute("PRAGMA table_info(conversations)")
-                columns = [col[1] for col in cursor.fetchall()]
-                
-                if 'model_used' not in columns:
-                    cursor.execute("ALTER TABLE conversations ADD COLUMN model_used TEXT")
-                    conn.commit()
-            else:
-                # Create new table
-                cursor.execute('''
-                    CREATE TABLE conversations (
-                        id INTEGER PRIMARY KEY,
-                        query TEXT,
-                        response TEXT,
-                        timestamp DATETIME,
-                        likes INTEGER DEFAULT 0,
-                        model_used TEXT
-                    )
-                ''')
-                conn.commit()
+        migrate(self.db_name)
                     
-    def save_conversation(self, query, response, model_used):
-        """Save conversation to database"""
-        with self._get_connection() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "INSERT INTO conversations (query, response, timestamp, model_used) VALUES (?, ?, ?, ?)",
-                (query, response, datetime.now(), model_used)
-            )
-            conn.commit()
-            return cur.lastrowid
+    @traced("db.save_conversation")
+    def save_conversation(self, query, response, model_used, usage=None):
+        """Save conversation through the shared writer thread and return its id"""
+        conv_id = self.writes.insert(query, response, model_used, usage)
+        events.publish("conversation_saved", conv_id=conv_id)
+        return conv_id
     
-    def get_recent_conversations(self, limit=5):
-        """Get recent conversations"""
+    @traced("db.get_recent_conversations")
+    def get_recent_conversations(self, limit=5, before=None):
+        """(id, query preview) of recent conversations, optionally those older than the `before` id"""
         with self._get_connection() as conn:
+            if before is None:
+                return conn.execute(
+                    "SELECT id, query_preview FROM conversations ORDER BY timestamp DESC, id DESC LIMIT ?",
+                    (limit,)
+                ).fetchall()
             return conn.execute(
-                "SELECT id, query, response FROM conversations ORDER BY timestamp DESC LIMIT ?",
-                (limit,)
+                f"""SELECT id, query_preview FROM conversations WHERE {BEFORE_SQL}
+                    ORDER BY timestamp DESC, id DESC LIMIT :limit""",
+                {"before": before, "limit": limit}
             ).fetchall()
     
+    @traced("db.search_conversations")
+    def search_conversations(self, text, limit=10):
+        """Full-text search over past queries and responses"""
+        match = build_fts_query(text)
+        if match is None:
+            return []
+        with self._get_connection() as conn:
+            return conn.execute(SEARCH_SQL, (match, limit)).fetchall()
+    
+    @traced("db.update_likes")
     def update_likes(self, conv_id):
-        """Increment like count"""
+        """Increment like count; applied with the next write-behind batch"""
+        self.writes.like(conv_id)
+        events.publish("conversation_liked", conv_id=conv_id)
+    
+    @traced("db.create_session")
+    def create_session(self, username, title):
+        """Start a new multi-turn session and return its id"""
+        now = int(time.time())
         with self._get_connection() as conn:
-            conn.execute(
-                "UPDATE conversations SET likes = likes + 1 WHERE id = ?",
-                (conv_id,)
+            cur = conn.execute(
+                "INSERT INTO sessions (username, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (username, title, now, now)
             )
-            conn.commit()
+        events.publish("session_updated", username=username)
+        return cur.lastrowid
+    
+    @traced("db.append_exchange")
+    def append_exchange(self, session_id, query, response, conv_id, model_used, username=None):
+        """Store one question/answer turn in a session; returns the two message ids"""
+        now = int(time.time())
+        if conv_id is not None:
+            # The saved conversation already holds both texts, compressed
+            query = response = None
+        with self._get_connection() as conn:
+            user_id = conn.execute(
+                "INSERT INTO messages (session_id, role, content, conversation_id, created_at) VALUES (?, 'user', ?, ?, ?)",
+                (session_id, query, conv_id, now)
+            ).lastrowid
+            assistant_id = conn.execute(
+                "INSERT INTO messages (session_id, role, content, conversation_id, model_used, created_at) VALUES (?, 'assistant', ?, ?, ?, ?)",
+                (session_id, response, conv_id, model_used, now)
+            ).lastrowid
+            conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+        events.publish("session_updated", username=username)
+        return user_id, assistant_id
+    
+    @traced("db.get_session_messages")
+    def get_session_messages(self, session_id, limit=None, before=None):
+        """Messages of a session in order; `limit`/`before` window the newest ones"""
+        with self._get_connection() as conn:
+            if self._local.archive:
+                # The linked conversation may have been moved to the archive since
+                query = "COALESCE(c.query, a.query)"
+                response = "hermes_decompress(COALESCE(c.response, a.response))"
+                joins = ("LEFT JOIN conversations c ON c.id = m.conversation_id "
+                         "LEFT JOIN archive.conversations a ON a.id = m.conversation_id AND c.id IS NULL")
+            else:
+                query, response = "c.query", "hermes_decompress(c.response)"
+                joins = "LEFT JOIN conversations c ON c.id = m.conversation_id"
+            sql = f"""SELECT m.id, m.role,
+                             COALESCE(m.content, CASE m.role WHEN 'user' THEN {query} ELSE {response} END),
+                             m.conversation_id
+                      FROM messages m {joins} WHERE m.session_id = ?"""
+            params = [session_id]
+            if before is not None:
+                sql += " AND m.id < ?"
+                params.append(before)
+            sql += " ORDER BY m.id DESC"
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+            rows = conn.execute(sql, params).fetchall()
+        return rows[::-1]
+    
+    @traced("db.get_recent_sessions")
+    def get_recent_sessions(self, username, limit=5):
+        """A user's sessions, most recently active first"""
+        with self._get_connection() as conn:
+            return conn.execute(
+                "SELECT id, title, updated_at FROM sessions WHERE username IS ? ORDER BY updated_at DESC LIMIT ?",
+                (username, limit)
+            ).fetchall()
+    
+    @traced("db.get_session_for_conversation")
+    def get_session_for_conversation(self, conv_id):
+        """Id of the session a conversation was asked in, if any"""
+        with self._get_connection() as conn:
+            row = conn.execute(
+                "SELECT session_id FROM messages WHERE conversation_id = ? LIMIT 1", (conv_id,)
+            ).fetchone()
+        return row[0] if row else None
     
+    @traced("db.delete_conversation")
     def delete_conversation(self, conv_id):
         """Delete conversation"""
         with self._get_connection() as conn:
             conn.execute("DELETE FROM conversations WHERE id = ?", (conv_id,))
+            if self._local.archive:
+                conn.execute("DELETE FROM archive.conversations WHERE id = ?", (conv_id,))
             conn.commit()
+        events.publish("conversation_deleted", conv_id=conv_id)
     
     def close_all(self):
-        """Close all connections"""
+        """Flush queued writes and close all connections"""
+        self.writes.close()
         if hasattr(self._local, 'conn'):
             self._local.conn.close()
\ No newline at end of file
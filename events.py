@@ -0,0 +1,21 @@
+import threading
+
+_subscribers = {}
+_lock = threading.Lock()
+
+
+def subscribe(event, callback):
+    """Call callback(**data) whenever event is published in this process"""
+    with _lock:
+        _subscribers.setdefault(event, []).append(callback)
+
+
+def publish(event, **data):
+    """Notify every subscriber of event; a failing subscriber doesn't affect the others"""
+    with _lock:
+        callbacks = list(_subscribers.get(event, ()))
+    for callback in callbacks:
+        try:
+            callback(**data)
+        except Exception:
+            pass
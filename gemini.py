@@ -1,59 +1,216 @@
-import google.generativeai as genai
-from google.api_core import exceptions
+import time
 import streamlit as st
 from config import Config
-from research_agent import ResearchAgent
+from metrics import span, span_seconds
+from model_registry import get_registry
+from router import get_router
+from search_cache import normalize_query
+from singleflight import generation_flight
+
+def build_research_prompt(query):
+    """Wrap a user query in the standard research response structure"""
+    return f"""Provide a detailed research response about: {query}
+                    Structure your response with:
+                    1. Key Findings (bullet points)
+                    2. Relevant Studies (with citations if possible)
+                    3. Current Challenges
+                    4. Future Directions"""
+
+def generation_key(prompt, preferred=None, generation_config=None):
+    """Coalescing key shared by the GUI, API and batch jobs: prompt, routed model and token limit"""
+    preferred = preferred or get_registry().model_names[0]
+    generation_config = generation_config or Config.GENERATION_CONFIG
+    return ("generate", preferred, generation_config["max_output_tokens"], normalize_query(prompt))
+
+def _registry_kwargs(preferred, generation_config):
+    return {
+        "preferred": preferred,
+        "generation_config": generation_config,
+        "safety_settings": Config.SAFETY_SETTINGS,
+    }
+
+def _generate_upstream(prompt, preferred, generation_config):
+    """One registry call, hedged when enabled; returns (text, model_name, label)"""
+    kwargs = _registry_kwargs(preferred, generation_config)
+    if Config.HEDGING_ENABLED:
+        return get_registry().generate_hedged(prompt, **kwargs)
+    text, model_name = get_registry().generate(prompt, **kwargs)
+    return text, model_name, model_name
+
+def _open_upstream(prompt, preferred, generation_config):
+    """Streaming counterpart of _generate_upstream; returns ((model_name, label), chunks)"""
+    kwargs = _registry_kwargs(preferred, generation_config)
+    if Config.HEDGING_ENABLED:
+        model_name, chunks, label = get_registry().open_stream_hedged(prompt, **kwargs)
+        return (model_name, label), chunks
+    model_name, chunks = get_registry().open_stream(prompt, **kwargs)
+    return (model_name, model_name), chunks
+
+def generate_coalesced(prompt, preferred=None, generation_config=None):
+    """Generate, sharing one upstream call with identical in-flight prompts from any caller.
+
+    Returns (text, model_name, label), label being the model_used value.
+    """
+    return generation_flight.do(
+        generation_key(prompt, preferred, generation_config),
+        lambda: _generate_upstream(prompt, preferred, generation_config)
+    )
+
+def open_stream_coalesced(prompt, preferred=None, generation_config=None):
+    """Streaming counterpart of generate_coalesced; returns (chunks, model_name, label)"""
+    (model_name, label), chunks = generation_flight.do_stream(
+        generation_key(prompt, preferred, generation_config),
+        lambda: _open_upstream(prompt, preferred, generation_config)
+    )
+    return chunks, model_name, label
 
 class GeminiAssistant:
     def __init__(self):
         self.config = Config()
-        self.model = self._initialize_model()
+        self.registry = get_registry()
+        self.model_name = self._initialize_model()
+        self.model = self.registry.get_client(self.model_name)
+        self.last_model_used = self.model_name
+        self.last_usage = None  # Token counts of the latest answer, when reported
         self.research_agent = None  # Lazy initialization
+        self._cache = None  # Semantic cache, attached on first use
+        self._cache_initialized = False
+        self.router = get_router() if self.config.ROUTING_ENABLED else None
         
     def _initialize_model(self):
-        """Initialize the first available model from the updated list"""
-        genai.configure(api_key=self.config.API_KEY)
-        
+        """Pick the first healthy model, reusing the process-wide health checks"""
         for model_name in self.config.MODEL_NAMES:
-            try:
-                model = genai.GenerativeModel(model_name)
-                # Test the model with a simple prompt
-                model.generate_content("Test connection")
+            with span("model_init"):
+                healthy, error = self.registry.check_health(model_name)
+            if healthy:
                 st.session_state.current_model = model_name
                 st.success(f"Connected to: {model_name}")
-                return model
-            except Exception as e:
-                st.warning(f"Model {model_name} unavailable: {str(e)}")
-                continue
+                return model_name
+            st.warning(f"Model {model_name} unavailable: {error}")
                 
         st.error("No working model found. Please check your API access.")
         st.stop()
     
-    def generate_response(self, prompt):
-        """Generate response from Gemini"""
+    def _use_model(self, model_name, label=None, preferred=None):
+        """Record the model that answered, sticking with it after a failover"""
+        preferred = preferred or self.model_name
+        self.last_model_used = label or model_name
+        if self.last_model_used == model_name and model_name != preferred and preferred == self.model_name:
+            # A hedge won by another model is not a failover, so only plain answers switch
+            st.warning(f"{self.model_name} is failing, switched to {model_name}")
+            self.model_name = model_name
+            self.model = self.registry.get_client(model_name)
+        st.session_state.current_model = self.model_name
+    
+    def _initialize_cache(self):
+        """Attach the shared semantic response cache if enabled"""
+        if not self.config.SEMANTIC_CACHE_ENABLED:
+            return None
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.config.GENERATION_CONFIG,
-                safety_settings=self.config.SAFETY_SETTINGS
-            )
-            return response.text
+            from semantic_cache import get_semantic_cache  # Pulls in faiss and numpy
+            return get_semantic_cache()
         except Exception as e:
-            raise RuntimeError(f"Generation failed: {str(e)}")
+            st.warning(f"Semantic cache unavailable: {str(e)}")
+            return None
+    
+    @property
+    def cache(self):
+        if not self._cache_initialized:
+            self._cache_initialized = True
+            self._cache = self._initialize_cache()
+        return self._cache
     
-    def generate_research_with_sources(self, query):
+    def find_cached_response(self, query, mode="standard"):
+        """Return a cached answer for a semantically similar query, or None"""
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.lookup(query, mode)
+        except Exception as e:
+            st.warning(f"Semantic cache lookup failed: {str(e)}")
+            return None
+    
+    def cache_response(self, conv_id, query, mode="standard"):
+        """Index a saved conversation so similar queries can reuse it"""
+        if self.cache is None:
+            return
+        try:
+            self.cache.add(conv_id, query, mode)
+        except Exception as e:
+            st.warning(f"Semantic cache update failed: {str(e)}")
+    
+    def _request_options(self, query):
+        """Pick (decision, preferred model, generation config), routing on the raw query"""
+        if self.router is None or query is None:
+            return None, self.model_name, self.config.GENERATION_CONFIG
+        decision = self.router.route(query)
+        return decision, decision.model, self.router.generation_config(decision)
+    
+    def _log_route(self, decision, started, first_token=None):
+        if decision is None:
+            return
+        try:
+            self.router.log(decision, self.last_model_used, time.monotonic() - started, first_token)
+        except Exception:
+            pass  # Routing telemetry must never fail a response
+    
+    def generate_response(self, prompt, query=None):
+        """Generate response from Gemini, failing over to the next model on errors.
+        
+        Passing the user's raw query lets the router pick the model.
+        """
+        decision, preferred, generation_config = self._request_options(query)
+        started = time.monotonic()
+        # Identical prompts already in flight from other sessions share one call
+        with span("generate"):
+            text, model_name, label = generate_coalesced(prompt, preferred, generation_config)
+        self.last_usage = getattr(text, "usage", None)
+        self._use_model(model_name, label, preferred)
+        self._log_route(decision, started)
+        return text
+    
+    def generate_response_stream(self, prompt, query=None):
+        """Stream response chunks from Gemini as they arrive"""
+        decision, preferred, generation_config = self._request_options(query)
+        started = time.monotonic()
+        chunks, model_name, label = open_stream_coalesced(prompt, preferred, generation_config)
+        first_token = time.monotonic() - started
+        span_seconds.observe(first_token, span="generate_stream.first_token")
+        self._use_model(model_name, label, preferred)
+        with span("generate_stream"):
+            yield from chunks
+        self.last_usage = chunks.usage
+        self._log_route(decision, started, first_token)
+    
+    def generate_research_with_sources(self, query, parallel=None, username=None):
         """Generate research response with sources using LangChain"""
+        if parallel is None:
+            parallel = self.config.RESEARCH_PARALLEL
+        self.last_model_used = self.model_name
+        if self.research_agent is not None and self.research_agent.username != username:
+            # Memory is per user, so a different login needs its own agent
+            self.research_agent = None
         if self.research_agent is None:
             try:
-                self.research_agent = ResearchAgent()
+                # LangChain is only loaded once a session asks for sources
+                from research_agent import ResearchAgent
+                self.research_agent = ResearchAgent(username=username)
             except Exception as e:
                 st.warning(f"Failed to initialize research agent: {str(e)}")
                 st.warning("Falling back to standard response generation...")
-                return self.generate_response(f"Provide a detailed research response about: {query}")
+                return self.generate_response(f"Provide a detailed research response about: {query}", query=query)
         
+        agent = self.research_agent
+        research = agent.research_parallel if parallel else agent.research
         try:
-            return self.research_agent.research(query)
+            # Agents carry per-user memory, so only one user's identical questions may share an answer
+            response = generation_flight.do(
+                ("sources", username, parallel, normalize_query(query)),
+                lambda: research(query)
+            )
+            self.last_usage = getattr(response, "usage", None)
+            return response
         except Exception as e:
             st.warning(f"Research agent error: {str(e)}")
             st.warning("Falling back to standard response generation...")
-            return self.generate_response(f"Provide a detailed research response about: {query}")
\ No newline at end of file
+            return self.generate_response(f"Provide a detailed research response about: {query}", query=query)
\ No newline at end of file
@@ -1,17 +1,17 @@
 import streamlit as st
 import atexit
-import base64
-from gemini import GeminiAssistant
+from gemini import GeminiAssistant, build_research_prompt
 from database import DatabaseManager
-from pdf import export_conversation_to_pdf
+from history import get_history_service
+from pdf import conversation_digest, get_pdf_exporter
 from auth import login_page, AuthManager
+from config import Config
+from warmup import start_warmup
 
 def initialize_session():
     """Initialize session state variables"""
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'gemini' not in st.session_state:
-        st.session_state.gemini = GeminiAssistant()
     if 'db' not in st.session_state:
         st.session_state.db = DatabaseManager()
     if 'logged_in' not in st.session_state:
@@ -20,6 +20,23 @@ def initialize_session():
         st.session_state.auth_manager = AuthManager()
     if 'use_sources' not in st.session_state:
         st.session_state.use_sources = False
+    if 'parallel_search' not in st.session_state:
+        st.session_state.parallel_search = Config.RESEARCH_PARALLEL
+    if 'history_cursors' not in st.session_state:
+        st.session_state.history_cursors = []
+    if 'pdf_export' not in st.session_state:
+        st.session_state.pdf_export = None
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = None
+    if 'has_older' not in st.session_state:
+        st.session_state.has_older = False
+
+def initialize_assistant():
+    """Connect to Gemini once logged in, preloading heavier libraries in the background"""
+    if Config.WARMUP_ENABLED:
+        start_warmup()
+    if 'gemini' not in st.session_state:
+        st.session_state.gemini = GeminiAssistant()
 
 def render_sidebar():
     """Render sidebar components"""
@@ -33,20 +50,22 @@ def render_sidebar():
             st.session_state.use_sources,
             help="Enable web search to find and cite sources"
         )
+        if st.session_state.use_sources:
+            st.session_state.parallel_search = st.toggle(
+                "Parallel search",
+                st.session_state.parallel_search,
+                help="Plan several searches up front and run them at once instead of step by step"
+            )
         
         # Conversation controls
         st.subheader("Conversation")
         if st.button("🔄 Clear Conversation"):
-            st.session_state.messages = []
+            start_new_session()
             st.rerun()
         
-        # Export to PDF button
+        # Export to PDF, built on a background worker
         if st.session_state.messages and len(st.session_state.messages) > 0:
-            if st.button("📄 Export to PDF"):
-                pdf_data = export_conversation_to_pdf(st.session_state.messages)
-                b64_pdf = base64.b64encode(pdf_data).decode('utf-8')
-                href = f'<a href="data:application/pdf;base64,{b64_pdf}" download="research_conversation.pdf">Download PDF</a>'
-                st.markdown(href, unsafe_allow_html=True)
+            render_pdf_export()
         
         # Logout button
         if st.button("🚪 Logout"):
@@ -57,16 +76,149 @@ def render_sidebar():
         st.markdown(f"**Current Model:**\n`{getattr(st.session_state, 'current_model', 'N/A')}`")
         st.markdown(f"**Logged in as:**\n`{getattr(st.session_state, 'username', 'N/A')}`")
         
-        st.markdown("**Conversation History**")
-        for conv in st.session_state.db.get_recent_conversations():
-            if st.button(f"🗨️ {conv[1][:30]}...", key=f"hist_{conv[0]}"):
-                load_conversation(conv[0])
+        render_sessions()
+        render_history()
+
+def start_new_session():
+    """Forget the open session; the next question starts a new one"""
+    st.session_state.messages = []
+    st.session_state.session_id = None
+    st.session_state.has_older = False
+
+def message_from_row(row):
+    """Chat message dict for a (id, role, content, conversation_id) messages row"""
+    return {"role": row[1], "content": row[2], "id": row[3], "message_id": row[0]}
+
+def session_transcript():
+    """Every message of the open session, for export"""
+    if st.session_state.session_id is None:
+        return st.session_state.messages
+    rows = st.session_state.db.get_session_messages(st.session_state.session_id)
+    return [message_from_row(row) for row in rows]
+
+def render_pdf_export():
+    """Start a background PDF build and offer the file once it is ready"""
+    username = st.session_state.get('username') or "User"
+    export = st.session_state.pdf_export
+    # Hash the full transcript being exported, not just the messages in the window
+    if export and export[0] != conversation_digest(session_transcript(), username):
+        # The conversation changed since the export was requested
+        export = st.session_state.pdf_export = None
+    
+    if export is None:
+        if st.button("📄 Export to PDF"):
+            transcript = session_transcript()
+            future = get_pdf_exporter().submit(transcript, username)
+            st.session_state.pdf_export = (conversation_digest(transcript, username), future)
+            st.rerun()
+        return
+    
+    future = export[1]
+    if not future.done():
+        st.caption("Building PDF in the background...")
+        if st.button("↻ Check export", key="pdf_check"):
+            st.rerun()
+    elif future.exception() is not None:
+        st.error(f"PDF export failed: {str(future.exception())}")
+        st.session_state.pdf_export = None
+    else:
+        st.download_button(
+            "⬇️ Download PDF",
+            data=future.result(),
+            file_name="research_conversation.pdf",
+            mime="application/pdf"
+        )
+
+def render_sessions():
+    """Render the user's recent multi-turn sessions"""
+    sessions = get_history_service().recent_sessions(
+        st.session_state.get('username'), limit=Config.SESSION_LIST_SIZE
+    )
+    if not sessions:
+        return
+    st.markdown("**Recent Sessions**")
+    for session_id, title, _ in sessions:
+        if st.button(f"💬 {title[:30]}", key=f"session_{session_id}"):
+            load_session(session_id)
+
+def load_session(session_id):
+    """Open a session showing only its latest messages"""
+    # One extra row tells whether older messages exist
+    rows = st.session_state.db.get_session_messages(session_id, limit=Config.CHAT_WINDOW_SIZE + 1)
+    st.session_state.has_older = len(rows) > Config.CHAT_WINDOW_SIZE
+    st.session_state.messages = [message_from_row(row) for row in rows[-Config.CHAT_WINDOW_SIZE:]]
+    st.session_state.session_id = session_id
+    st.rerun()
+
+def load_older_messages():
+    """Page the previous CHAT_PAGE_SIZE messages of the open session into view"""
+    messages = st.session_state.messages
+    rows = st.session_state.db.get_session_messages(
+        st.session_state.session_id,
+        limit=Config.CHAT_PAGE_SIZE + 1,
+        before=messages[0]["message_id"]
+    )
+    st.session_state.has_older = len(rows) > Config.CHAT_PAGE_SIZE
+    st.session_state.messages = [message_from_row(row) for row in rows[-Config.CHAT_PAGE_SIZE:]] + messages
+
+def trim_window():
+    """Drop messages scrolled past the window so long sessions stay bounded in memory"""
+    messages = st.session_state.messages
+    if len(messages) > Config.CHAT_WINDOW_SIZE:
+        st.session_state.messages = messages[-Config.CHAT_WINDOW_SIZE:]
+        st.session_state.has_older = True
+
+def render_history():
+    """Render one keyset-paginated page of conversation history"""
+    st.markdown("**Conversation History**")
+    search = st.text_input("Search history", key="history_search", placeholder="Search past research...")
+    if search.strip():
+        render_search_results(search)
+        return
+    
+    cursors = st.session_state.history_cursors
+    page_size = Config.HISTORY_PAGE_SIZE
+    
+    # Fetch one extra row to know whether an older page exists
+    rows = get_history_service().recent_conversations(
+        limit=page_size + 1,
+        before=cursors[-1] if cursors else None
+    )
+    for conv in rows[:page_size]:
+        if st.button(f"🗨️ {conv[1][:30]}...", key=f"hist_{conv[0]}"):
+            load_conversation(conv[0])
+    
+    cols = st.columns(2)
+    with cols[0]:
+        if cursors and st.button("◀ Newer", key="hist_newer"):
+            cursors.pop()
+            st.rerun()
+    with cols[1]:
+        if len(rows) > page_size and st.button("Older ▶", key="hist_older"):
+            cursors.append(rows[page_size - 1][0])
+            st.rerun()
+
+def render_search_results(search):
+    """Render full-text search hits in place of the history list"""
+    results = st.session_state.db.search_conversations(search)
+    if not results:
+        st.caption("No matching conversations")
+    for conv_id, query, snippet, _ in results:
+        if st.button(f"🔎 {query[:40]}", key=f"search_{conv_id}"):
+            load_conversation(conv_id)
+        st.caption(snippet)
 
 def load_conversation(conv_id):
-    """Load specific conversation by ID"""
+    """Load specific conversation by ID, opening its session when it has one"""
+    session_id = st.session_state.db.get_session_for_conversation(conv_id)
+    if session_id is not None:
+        load_session(session_id)
+        return
+    
     conv = st.session_state.db.get_conversation_by_id(conv_id)
     
     if conv:
+        start_new_session()
         st.session_state.messages = [
             {"role": "user", "content": conv[1]},
             {"role": "assistant", "content": conv[2], "id": conv[0]}
@@ -81,10 +233,17 @@ def render_chat_interface():
     else:
         st.caption("Powered by Gemini AI - Get instant research summaries")
     
+    # Only the windowed messages are rendered; older ones are paged in on demand
+    if st.session_state.has_older and st.button("⬆️ Load older messages"):
+        load_older_messages()
+        st.rerun()
+    
     # Display messages
     for i, message in enumerate(st.session_state.messages):
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
+            if message.get("cached"):
+                st.caption("⚡ Served from semantic cache")
             if message["role"] == "assistant" and i > 0:
                 cols = st.columns([1, 1, 10])
                 with cols[0]:
@@ -92,7 +251,11 @@ def render_chat_interface():
                         st.session_state.db.update_likes(message["id"])
                 with cols[1]:
                     if st.button("🗑️", key=f"delete_{i}"):
+                        # Also removes the exchange from its session
                         st.session_state.db.delete_conversation(message["id"])
+                        st.session_state.messages = [
+                            m for m in st.session_state.messages if m.get("id") != message["id"]
+                        ]
                         st.rerun()
     
     # User input
@@ -107,37 +270,65 @@ def handle_user_input(prompt):
     st.session_state.messages.append({"role": "user", "content": prompt})
     
     with st.chat_message("assistant"):
-        with st.spinner("Researching..." + (" (with sources)" if st.session_state.use_sources else "")):
-            try:
-                if st.session_state.use_sources:
-                    # Use LangChain for sourced research
-                    response = st.session_state.gemini.generate_research_with_sources(prompt)
-                else:
-                    # Use standard Gemini response
-                    research_prompt = f"""Provide a detailed research response about: {prompt}
-                    Structure your response with:
-                    1. Key Findings (bullet points)
-                    2. Relevant Studies (with citations if possible)
-                    3. Current Challenges
-                    4. Future Directions"""
-                    
-                    response = st.session_state.gemini.generate_response(research_prompt)
-                
-                conv_id = st.session_state.db.save_conversation(
-                    prompt, 
-                    response, 
-                    st.session_state.current_model
-                )
-                
+        try:
+            mode = "sources" if st.session_state.use_sources else "standard"
+            with st.spinner("Checking earlier research..."):
+                cached = st.session_state.gemini.find_cached_response(prompt, mode)
+            
+            if cached:
+                response = cached.response
+                model_used = f"{cached.model_used} (cached)"
+                st.markdown(response)
+                st.caption(f"⚡ Served from semantic cache (similarity {cached.score:.2f})")
+            elif st.session_state.use_sources:
+                # Use LangChain for sourced research
+                with st.spinner("Researching... (with sources)"):
+                    response = st.session_state.gemini.generate_research_with_sources(
+                        prompt,
+                        parallel=st.session_state.parallel_search,
+                        username=st.session_state.get('username')
+                    )
+                model_used = st.session_state.gemini.last_model_used
                 st.markdown(response)
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": response,
-                    "id": conv_id
-                })
-                
-            except Exception as e:
-                st.error(f"Research failed: {str(e)}")
+            else:
+                # Stream the standard Gemini response into the chat as it arrives
+                research_prompt = build_research_prompt(prompt)
+                response = st.write_stream(
+                    st.session_state.gemini.generate_response_stream(research_prompt, query=prompt)
+                )
+                model_used = st.session_state.gemini.last_model_used
+            
+            # Persist only once the full answer is available
+            conv_id = st.session_state.db.save_conversation(
+                prompt, 
+                response, 
+                model_used,
+                usage=None if cached else st.session_state.gemini.last_usage
+            )
+            if not cached:
+                st.session_state.gemini.cache_response(conv_id, prompt, mode)
+            
+            if st.session_state.session_id is None:
+                st.session_state.session_id = st.session_state.db.create_session(
+                    st.session_state.get('username'), prompt[:60]
+                )
+            user_message_id, message_id = st.session_state.db.append_exchange(
+                st.session_state.session_id, prompt, response, conv_id, model_used,
+                username=st.session_state.get('username')
+            )
+            st.session_state.messages[-1].update({"id": conv_id, "message_id": user_message_id})
+            
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": response,
+                "id": conv_id,
+                "message_id": message_id,
+                "cached": bool(cached)
+            })
+            trim_window()
+            
+        except Exception as e:
+            st.error(f"Research failed: {str(e)}")
 
 def main():
     st.set_page_config(page_title="Hermes Research AI", layout="wide")
@@ -154,6 +345,7 @@ def main():
     if not st.session_state.logged_in:
         login_page()
     else:
+        initialize_assistant()
         render_sidebar()
         render_chat_interface()
 
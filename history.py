@@ -0,0 +1,81 @@
+import threading
+import time
+import events
+from config import Config
+from database import DatabaseManager
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_history_service(db_name='research_chat.db'):
+    """Return the process-wide sidebar history service"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = HistoryService(DatabaseManager(db_name))
+        return _service
+
+
+class HistoryService:
+    """Cached id/preview projections for the sidebar, invalidated by write events.
+
+    Conversations are shared by every user, so their pages are cached once;
+    session lists are cached per user. A TTL only bounds staleness from
+    writes made by other processes, such as the API.
+    """
+
+    def __init__(self, db, ttl=None):
+        self.db = db
+        self.ttl = ttl or Config.HISTORY_CACHE_TTL
+        self._conversations = {}  # (before, limit) -> (rows, cached_at)
+        self._sessions = {}  # (username, limit) -> (rows, cached_at)
+        self._generation = 0  # Bumped on every invalidation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        events.subscribe("conversation_saved", self._invalidate_conversations)
+        events.subscribe("conversation_deleted", self._invalidate_conversations)
+        events.subscribe("conversations_archived", self._invalidate_conversations)
+        events.subscribe("session_updated", self._invalidate_sessions)
+        # Likes are published too but don't change the id/preview projection
+
+    def recent_conversations(self, limit=5, before=None):
+        """(id, query preview) rows, newest first, keyset-paged by `before`"""
+        return self._cached(
+            self._conversations, (before, limit),
+            lambda: self.db.get_recent_conversations(limit=limit, before=before)
+        )
+
+    def recent_sessions(self, username, limit=5):
+        """(id, title, updated_at) rows of the user's latest sessions"""
+        return self._cached(
+            self._sessions, (username, limit),
+            lambda: self.db.get_recent_sessions(username, limit=limit)
+        )
+
+    def _cached(self, cache, key, load):
+        with self._lock:
+            entry = cache.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+        rows = load()
+        with self._lock:
+            # Don't cache a result that an invalidation raced past
+            if generation == self._generation:
+                cache[key] = (rows, time.monotonic())
+        return rows
+
+    def _invalidate_conversations(self, **_):
+        with self._lock:
+            self._generation += 1
+            self._conversations.clear()
+
+    def _invalidate_sessions(self, username=None, **_):
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._sessions if key[0] == username]:
+                del self._sessions[key]
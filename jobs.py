@@ -0,0 +1,187 @@
+import asyncio
+import random
+import time
+from config import Config
+from gemini import build_research_prompt, generate_coalesced
+
+class TokenBucket:
+    """Async token bucket shared by every worker so the pool stays under quota"""
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class JobRunner:
+    """SQLite-backed batch research queue drained by a pool of async workers"""
+
+    def __init__(self, db, workers=None, limiter=None):
+        self.db = db
+        self.worker_count = workers or Config.JOB_WORKERS
+        self.limiter = limiter or TokenBucket(Config.JOB_RATE_LIMIT_RPM, Config.JOB_RATE_BURST)
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    async def start(self):
+        # Items left running by a crashed process go back to the queue
+        await self.db.execute("UPDATE job_items SET status = 'pending' WHERE status = 'running'")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, queries, mode="standard"):
+        """Queue a batch of queries and return the job id"""
+        now = int(time.time())
+        async with self.db.writer() as conn:
+            cursor = await conn.execute(
+                "INSERT INTO jobs (status, mode, total, created_at) VALUES ('queued', ?, ?, ?)",
+                (mode, len(queries), now)
+            )
+            job_id = cursor.lastrowid
+            await conn.executemany(
+                "INSERT INTO job_items (job_id, position, query, status, attempts, updated_at) VALUES (?, ?, ?, 'pending', 0, ?)",
+                [(job_id, position, query, now) for position, query in enumerate(queries)]
+            )
+        self._wakeup.set()
+        return job_id
+
+    async def progress(self, job_id):
+        """Job row plus per-status item counts, or None"""
+        job = await self.db.fetch_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if job is None:
+            return None
+        counts = await self.db.fetch_all(
+            "SELECT status, COUNT(*) AS n FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+        )
+        job.update({status: 0 for status in ("pending", "running", "done", "failed")})
+        job.update({row["status"]: row["n"] for row in counts})
+        return job
+
+    async def finished_items(self, job_id):
+        """Completed or failed items with their responses, in submission order"""
+        return await self.db.fetch_all(
+            """SELECT i.position, i.query, i.status, i.conversation_id, i.error,
+                      hermes_decompress(c.response) AS response
+               FROM job_items i LEFT JOIN conversations c ON c.id = i.conversation_id
+               WHERE i.job_id = ? AND i.status IN ('done', 'failed')
+               ORDER BY i.position""",
+            (job_id,)
+        )
+
+    async def _claim(self):
+        """Atomically move the oldest pending item to running"""
+        async with self.db.writer() as conn:
+            async with conn.execute(
+                """SELECT i.id, i.job_id, i.query, j.mode FROM job_items i
+                   JOIN jobs j ON j.id = i.job_id
+                   WHERE i.status = 'pending' ORDER BY i.id LIMIT 1"""
+            ) as cursor:
+                item = await cursor.fetchone()
+            if item is None:
+                return None
+            await conn.execute(
+                "UPDATE job_items SET status = 'running', updated_at = ? WHERE id = ?",
+                (int(time.time()), item["id"])
+            )
+            await conn.execute("UPDATE jobs SET status = 'running' WHERE id = ? AND status = 'queued'", (item["job_id"],))
+            return dict(item)
+
+    async def _worker(self):
+        agent = None
+        while True:
+            try:
+                item = await self._claim()
+            except Exception:
+                # e.g. "database is locked"; try again on the next poll
+                await asyncio.sleep(Config.JOB_POLL_INTERVAL)
+                continue
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=Config.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                if item["mode"] == "sources" and agent is None:
+                    agent = await asyncio.to_thread(self._create_agent)
+                await self._process(item, agent)
+            except Exception as e:
+                # One broken item must not end the worker and strand the rest of the queue
+                await self._fail(item, str(e))
+
+    def _create_agent(self):
+        from research_agent import ResearchAgent
+        return ResearchAgent(raise_errors=True)
+
+    def _generate(self, query, mode, agent):
+        """Blocking generation, run on a worker thread"""
+        if mode == "sources":
+            # Batch topics are unrelated, so don't carry memory between them
+            agent.memory.chat_memory.messages = []
+            agent.memory.moving_summary_buffer = ""
+            return agent.research_parallel(query), Config.MODEL_NAMES[0]
+        text, _, label = generate_coalesced(build_research_prompt(query))
+        return text, label
+
+    async def _process(self, item, agent):
+        error = None
+        for attempt in range(1, Config.JOB_MAX_ATTEMPTS + 1):
+            await self.limiter.acquire()
+            try:
+                response, model_used = await asyncio.to_thread(self._generate, item["query"], item["mode"], agent)
+                break
+            except Exception as e:
+                error = str(e)
+                await self.db.execute("UPDATE job_items SET attempts = ? WHERE id = ?", (attempt, item["id"]))
+                if attempt < Config.JOB_MAX_ATTEMPTS:
+                    # Exponential backoff with jitter
+                    await asyncio.sleep(Config.JOB_RETRY_BASE_DELAY * 2 ** (attempt - 1) * (1 + random.random()))
+        else:
+            await self._finish(item, "failed", error=error)
+            return
+
+        conv_id = await self.db.save_conversation(
+            item["query"], response, model_used, usage=getattr(response, "usage", None)
+        )
+        await self._finish(item, "done", conversation_id=conv_id)
+
+    async def _fail(self, item, error):
+        try:
+            await self._finish(item, "failed", error=error)
+        except Exception:
+            pass  # Still 'running'; start() puts it back in the queue after a restart
+
+    async def _finish(self, item, status, conversation_id=None, error=None):
+        now = int(time.time())
+        async with self.db.writer() as conn:
+            await conn.execute(
+                "UPDATE job_items SET status = ?, conversation_id = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, conversation_id, error, now, item["id"])
+            )
+            await conn.execute(
+                """UPDATE jobs SET status = 'completed', finished_at = ?
+                   WHERE id = ? AND NOT EXISTS (
+                       SELECT 1 FROM job_items WHERE job_id = ? AND status IN ('pending', 'running')
+                   )""",
+                (now, item["job_id"], item["job_id"])
+            )
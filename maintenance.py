@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+import events
+from archive import archive_conversations, archive_path, ensure_archive
+from config import Config
+from metrics import span
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def start_maintenance(db_name='research_chat.db'):
+    """Start the process-wide maintenance scheduler for a database, if enabled"""
+    if not Config.MAINTENANCE_ENABLED:
+        return None
+    if Config.ARCHIVE_ENABLED:
+        # Connections only attach an archive that exists when they open
+        ensure_archive(db_name)
+    with _schedulers_lock:
+        if db_name not in _schedulers:
+            scheduler = MaintenanceScheduler(db_name)
+            scheduler.start()
+            _schedulers[db_name] = scheduler
+        return _schedulers[db_name]
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {int(Config.DB_BUSY_TIMEOUT_MS)}")
+    return conn
+
+
+def vacuum_incrementally(path, pages=None):
+    """Return free pages to the filesystem, converting the file to incremental auto-vacuum once"""
+    conn = _connect(path)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            if not Config.MAINTENANCE_CONVERT_AUTO_VACUUM:
+                return 0
+            # The mode only changes with a full VACUUM; this happens on the first run only
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            return 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        pages = min(free, pages or Config.MAINTENANCE_VACUUM_PAGES)
+        if pages:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        return pages
+    finally:
+        conn.close()
+
+
+def optimize(path):
+    """Refresh planner statistics where SQLite thinks they are stale"""
+    conn = _connect(path)
+    try:
+        conn.execute(f"PRAGMA analysis_limit = {int(Config.MAINTENANCE_ANALYSIS_LIMIT)}")
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            # A fresh connection's optimize only analyzes tables that have stats already
+            conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+
+def checkpoint(path):
+    """Copy the WAL into the database file; returns (busy, wal pages, checkpointed pages)"""
+    conn = _connect(path)
+    try:
+        return tuple(conn.execute(f"PRAGMA wal_checkpoint({Config.MAINTENANCE_CHECKPOINT_MODE})").fetchone())
+    finally:
+        conn.close()
+
+
+class MaintenanceScheduler:
+    """Runs archival, incremental vacuum, PRAGMA optimize and WAL checkpoints on a timer"""
+
+    def __init__(self, db_name='research_chat.db', interval=None):
+        self.db_name = db_name
+        self.interval = interval or Config.MAINTENANCE_INTERVAL
+        self.last_run = None  # Results of the latest run, per task
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        # Wait one interval first so startup isn't slowed by a VACUUM
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def _task(self, results, name, fn):
+        try:
+            # Results are keyed per file, but spans per task keep the metric labels bounded
+            with span(f"maintenance.{name.split(':')[0]}"):
+                results[name] = fn()
+        except Exception as e:
+            results[name] = f"failed: {str(e)}"  # Retried on the next run
+
+    def run_once(self):
+        """Run every maintenance task once; returns {task: result}"""
+        results = {}
+        paths = [self.db_name]
+        if Config.ARCHIVE_ENABLED:
+            self._task(results, "archive", lambda: archive_conversations(self.db_name, stop=self._stop))
+            if isinstance(results["archive"], int) and results["archive"]:
+                events.publish("conversations_archived", count=results["archive"])
+            paths.append(archive_path(self.db_name))
+        for path in paths:
+            self._task(results, f"vacuum:{path}", lambda: vacuum_incrementally(path))
+            self._task(results, f"optimize:{path}", lambda: optimize(path))
+            self._task(results, f"checkpoint:{path}", lambda: checkpoint(path))
+        self.last_run = results
+        return results
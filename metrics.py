@@ -0,0 +1,236 @@
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("hermes.trace")
+
+# Seconds; spans range from sub-millisecond DB reads to minute-long research runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labels, key)} {value}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {state[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {state[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labels=()):
+        return self._add(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        """Add a callable returning [(name, kind, help, [(labels dict, value), ...])] at render time"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collect in collectors:
+            for name, kind, documentation, values in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    labels = dict(labels)
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+span_seconds = REGISTRY.histogram(
+    "hermes_span_seconds", "Duration of traced pipeline stages", ["span"]
+)
+span_errors = REGISTRY.counter(
+    "hermes_span_errors_total", "Traced stages that raised", ["span"]
+)
+llm_tokens = REGISTRY.counter(
+    "hermes_llm_tokens_total", "Gemini tokens reported in response metadata", ["model", "kind"]
+)
+http_request_seconds = REGISTRY.histogram(
+    "hermes_http_request_seconds", "API request duration, streams included", ["method", "route", "status"]
+)
+
+_stack = threading.local()
+
+
+@contextmanager
+def span(name):
+    """Time a stage into hermes_span_seconds and log it with its parent stages"""
+    stack = _stack.__dict__.setdefault("names", [])
+    stack.append(name)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        span_errors.inc(span=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        span_seconds.observe(elapsed, span=name)
+        logger.debug("%s %.1f ms", " > ".join(stack), elapsed * 1000)
+        stack.pop()
+
+
+def traced(name):
+    """Decorator form of span()"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def usage_from_response(response):
+    """Token counts from a Gemini response or final stream chunk, or None"""
+    metadata = getattr(response, "usage_metadata", None)
+    if not metadata or not getattr(metadata, "total_token_count", None):
+        return None
+    return {
+        "prompt_tokens": metadata.prompt_token_count,
+        "output_tokens": metadata.candidates_token_count,
+        "total_tokens": metadata.total_token_count,
+    }
+
+
+def usage_from_message(message):
+    """Token counts from a LangChain AIMessage's usage_metadata, or None"""
+    metadata = getattr(message, "usage_metadata", None)
+    if not metadata:
+        return None
+    return {
+        "prompt_tokens": metadata.get("input_tokens", 0),
+        "output_tokens": metadata.get("output_tokens", 0),
+        "total_tokens": metadata.get("total_tokens", 0),
+    }
+
+
+def add_usage(total, usage):
+    """Sum two usage dicts, either of which may be None"""
+    if usage is None:
+        return total
+    if total is None:
+        return dict(usage)
+    return {key: total.get(key, 0) + usage.get(key, 0) for key in usage}
+
+
+def record_usage(model, usage):
+    if usage is None:
+        return
+    llm_tokens.inc(usage["prompt_tokens"] or 0, model=model, kind="prompt")
+    llm_tokens.inc(usage["output_tokens"] or 0, model=model, kind="output")
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template and status"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                method=scope["method"], route=route, status=str(status["code"])
+            )
@@ -0,0 +1,314 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config import Config
+from metrics import record_usage, usage_from_response
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide model registry shared by every session"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+def _default_client_factory(model_name):
+    # The SDK takes about a second to import, so load it with the first real client
+    import google.generativeai as genai
+    genai.configure(api_key=Config.API_KEY)
+    return genai.GenerativeModel(model_name)
+
+
+class GeneratedText(str):
+    """Generated text that also carries the response's token usage (or None)"""
+
+    usage = None
+
+
+class ChunkStream:
+    """Iterator of text chunks; usage holds the token counts once it is exhausted"""
+
+    def __init__(self, chunks=None):
+        self.usage = None
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+
+
+class CircuitBreaker:
+    """Stops sending traffic to a model after repeated failures"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may be attempted right now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let a single trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ModelRegistry:
+    """Initialized Gemini clients, cached health checks and per-model circuit breakers"""
+
+    def __init__(self, model_names=None, client_factory=None, config=Config):
+        self.config = config
+        self.model_names = list(model_names or config.MODEL_NAMES)
+        self.client_factory = client_factory or _default_client_factory
+        self._clients = {}
+        self._health = {}  # model name -> (healthy, error, checked_at)
+        self._breakers = {
+            name: CircuitBreaker(config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_TIMEOUT)
+            for name in self.model_names
+        }
+        # Recent successful latencies per (kind, model), used to time hedges
+        self._latencies = {}
+        self._hedge_pool = None
+        self.hedge_stats = {"requests": 0, "hedged": 0, "primary_wins": 0, "secondary_wins": 0}
+        self._lock = threading.Lock()
+
+    def get_client(self, model_name):
+        """Return the shared client for a model, creating it once"""
+        with self._lock:
+            if model_name not in self._clients:
+                self._clients[model_name] = self.client_factory(model_name)
+            return self._clients[model_name]
+
+    def check_health(self, model_name):
+        """Return (healthy, error), probing the model at most once per TTL"""
+        cached = self._health.get(model_name)
+        if cached and time.monotonic() - cached[2] < self.config.MODEL_HEALTH_TTL:
+            return cached[0], cached[1]
+
+        try:
+            self.get_client(model_name).generate_content("Test connection")
+            result = (True, None)
+            self._breakers[model_name].record_success()
+        except Exception as e:
+            result = (False, str(e))
+        self._health[model_name] = result + (time.monotonic(),)
+        return result
+
+    def breaker(self, model_name):
+        return self._breakers[model_name]
+
+    def _candidates(self, preferred):
+        """Models to try in order: the preferred one, then the rest of MODEL_NAMES.
+
+        Lazy, so a breaker is only consulted (and a half-open trial only
+        claimed) right before that model is actually called.
+        """
+        names = list(self.model_names)
+        if preferred in names:
+            names.remove(preferred)
+            names.insert(0, preferred)
+        for name in names:
+            if self._breakers[name].allow():
+                yield name
+
+    def _request_kwargs(self, generation_config, safety_settings):
+        return {
+            "generation_config": generation_config or self.config.GENERATION_CONFIG,
+            "safety_settings": safety_settings or self.config.SAFETY_SETTINGS,
+        }
+
+    def _record_latency(self, kind, model_name, seconds):
+        with self._lock:
+            window = self._latencies.setdefault(
+                (kind, model_name), deque(maxlen=self.config.HEDGE_LATENCY_WINDOW)
+            )
+            window.append(seconds)
+
+    def hedge_delay(self, kind, model_name):
+        """Seconds to wait on the primary before hedging: a latency percentile, once known"""
+        with self._lock:
+            samples = sorted(self._latencies.get((kind, model_name), ()))
+        if len(samples) < self.config.HEDGE_MIN_SAMPLES:
+            return self.config.HEDGE_DEFAULT_DELAY
+        index = int(round(self.config.HEDGE_PERCENTILE / 100 * (len(samples) - 1)))
+        return samples[index]
+
+    def _generate_one(self, model_name, prompt, kwargs):
+        """One non-streamed call, feeding the breaker and latency window"""
+        started = time.monotonic()
+        try:
+            response = self.get_client(model_name).generate_content(prompt, **kwargs)
+            text = GeneratedText(response.text)
+        except Exception:
+            self._breakers[model_name].record_failure()
+            raise
+        self._breakers[model_name].record_success()
+        self._record_latency("generate", model_name, time.monotonic() - started)
+        text.usage = usage_from_response(response)
+        record_usage(model_name, text.usage)
+        return text
+
+    def _open_one(self, model_name, prompt, kwargs):
+        """Start one stream and wait for its first chunk (time to first token)"""
+        started = time.monotonic()
+        try:
+            response = iter(self.get_client(model_name).generate_content(prompt, stream=True, **kwargs))
+            first = next(response, None)
+        except Exception:
+            self._breakers[model_name].record_failure()
+            raise
+        self._record_latency("stream", model_name, time.monotonic() - started)
+        # The generator fills in stream.usage as chunks arrive
+        stream = ChunkStream()
+        stream._chunks = self._stream_chunks(model_name, first, response, stream)
+        return stream
+
+    def generate(self, prompt, preferred=None, generation_config=None, safety_settings=None):
+        """Generate with failover; returns (text, model_name)"""
+        kwargs = self._request_kwargs(generation_config, safety_settings)
+        errors = []
+        for model_name in self._candidates(preferred):
+            try:
+                return self._generate_one(model_name, prompt, kwargs), model_name
+            except Exception as e:
+                errors.append(f"{model_name}: {str(e)}")
+        raise RuntimeError("All models failed: " + ("; ".join(errors) or "every circuit is open"))
+
+    def open_stream(self, prompt, preferred=None, generation_config=None, safety_settings=None):
+        """Start a streamed generation with failover before the first chunk.
+
+        Returns (model_name, iterator of text chunks).
+        """
+        kwargs = self._request_kwargs(generation_config, safety_settings)
+        errors = []
+        for model_name in self._candidates(preferred):
+            try:
+                return model_name, self._open_one(model_name, prompt, kwargs)
+            except Exception as e:
+                errors.append(f"{model_name}: {str(e)}")
+        raise RuntimeError("All models failed: " + ("; ".join(errors) or "every circuit is open"))
+
+    def generate_hedged(self, prompt, preferred=None, generation_config=None, safety_settings=None):
+        """Generate, hedging to the next model if the primary is slow.
+
+        Returns (text, model_name, label) where label is the model_used value,
+        tagged with the hedge winner when a hedge was fired.
+        """
+        kwargs = self._request_kwargs(generation_config, safety_settings)
+        return self._hedge("generate", lambda name: self._generate_one(name, prompt, kwargs), preferred)
+
+    def open_stream_hedged(self, prompt, preferred=None, generation_config=None, safety_settings=None):
+        """Streaming counterpart of generate_hedged, racing on time to first chunk.
+
+        Returns (model_name, iterator of text chunks, label).
+        """
+        kwargs = self._request_kwargs(generation_config, safety_settings)
+        chunks, model_name, label = self._hedge(
+            "stream", lambda name: self._open_one(name, prompt, kwargs), preferred
+        )
+        return model_name, chunks, label
+
+    def _hedge(self, kind, call, preferred):
+        candidates = self._candidates(preferred)
+        primary = next(candidates, None)
+        if primary is None:
+            raise RuntimeError("All models failed: every circuit is open")
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=self.config.HEDGE_MAX_WORKERS, thread_name_prefix="hedge"
+                )
+            self.hedge_stats["requests"] += 1
+
+        futures = {self._hedge_pool.submit(call, primary): primary}
+        done, _ = wait(futures, timeout=self.hedge_delay(kind, primary))
+        secondary = None
+        if not done or next(iter(done)).exception() is not None:
+            # Primary is slow (hedge) or already failed (plain failover)
+            secondary = next(candidates, None)
+            if secondary is not None:
+                futures[self._hedge_pool.submit(call, secondary)] = secondary
+        hedged = not done and secondary is not None
+        if hedged:
+            with self._lock:
+                self.hedge_stats["hedged"] += 1
+
+        errors = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    errors.append(f"{futures[future]}: {str(future.exception())}")
+                    continue
+                for loser in pending:
+                    self._cancel(loser)
+                winner = futures[future]
+                label = winner
+                if hedged:
+                    role = "primary" if winner == primary else "secondary"
+                    with self._lock:
+                        self.hedge_stats[f"{role}_wins"] += 1
+                    label = f"{winner} [hedged: {role} won]"
+                return future.result(), winner, label
+        raise RuntimeError("All models failed: " + "; ".join(errors))
+
+    def _cancel(self, future):
+        """Abandon a losing call; a stream that still arrives is closed at once"""
+        if future.cancel():
+            return
+
+        def close_late(finished):
+            if finished.exception() is None and hasattr(finished.result(), "close"):
+                finished.result().close()
+
+        future.add_done_callback(close_late)
+
+    def _stream_chunks(self, model_name, first, response, stream):
+        try:
+            chunk = first
+            while chunk is not None:
+                # Every chunk reports the running totals; the last one wins
+                stream.usage = usage_from_response(chunk) or stream.usage
+                if chunk.parts:
+                    yield chunk.text
+                chunk = next(response, None)
+        except Exception as e:
+            self._breakers[model_name].record_failure()
+            raise RuntimeError(f"Generation failed: {str(e)}")
+        self._breakers[model_name].record_success()
+        record_usage(model_name, stream.usage)
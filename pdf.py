@@ -1,29 +1,19 @@
+import hashlib
 import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-import base64
-import markdown
-from PIL import Image as PILImage
-import streamlit as st
+from config import Config
+from metrics import traced
 
-def export_conversation_to_pdf(messages, username="User"):
-    """Export conversation to PDF with improved formatting"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=A4, 
-        rightMargin=0.5*inch, 
-        leftMargin=0.5*inch,
-        topMargin=0.75*inch, 
-        bottomMargin=0.75*inch
-    )
-    
+def _build_styles():
+    """Stylesheet shared by every export"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     styles = getSampleStyleSheet()
-    
+
     # Create custom styles
     styles.add(ParagraphStyle(
         name='User',
@@ -37,7 +27,7 @@ def export_conversation_to_pdf(messages, username="User"):
         borderColor=colors.HexColor('#E5E5E5'),  # Light gray
         borderRadius=5
     ))
-    
+
     styles.add(ParagraphStyle(
         name='Assistant',
         parent=styles['Normal'],
@@ -50,7 +40,7 @@ def export_conversation_to_pdf(messages, username="User"):
         borderColor=colors.HexColor('#E5E5E5'),  # Light gray
         borderRadius=5
     ))
-    
+
     styles.add(ParagraphStyle(
         name='Header',
         parent=styles['Heading1'],
@@ -59,7 +49,7 @@ def export_conversation_to_pdf(messages, username="User"):
         alignment=1,  # Center alignment
         spaceAfter=20
     ))
-    
+
     styles.add(ParagraphStyle(
         name='Subheader',
         parent=styles['Heading2'],
@@ -68,7 +58,7 @@ def export_conversation_to_pdf(messages, username="User"):
         alignment=0,  # Left alignment
         spaceAfter=10
     ))
-    
+
     styles.add(ParagraphStyle(
         name='Footer',
         parent=styles['Normal'],
@@ -76,62 +66,155 @@ def export_conversation_to_pdf(messages, username="User"):
         textColor=colors.gray,
         alignment=1  # Center alignment
     ))
-    
-    story = []
-    
-    # Try to add logo if available
+    return styles
+
+def _build_logo():
+    """PNG bytes for the logo placeholder, or None if PIL can't render it"""
     try:
-        # Create a logo placeholder for the PDF
+        from PIL import Image as PILImage
         logo_io = io.BytesIO()
         logo_image = PILImage.new('RGB', (200, 60), color=(30, 61, 89))
         logo_image.save(logo_io, format='PNG')
-        logo_data = logo_io.getvalue()
-        
-        # Add logo to PDF
-        logo = Image(io.BytesIO(logo_data), width=2*inch, height=0.6*inch)
-        story.append(logo)
+        return logo_io.getvalue()
     except Exception:
-        # Skip logo if there's an issue
-        pass
-    
+        return None
+
+# ReportLab, PIL and markdown are only imported by the first export (or the
+# warm-up thread), so pages that never export don't pay for them
+_assets = None
+_assets_lock = threading.Lock()
+
+def load_assets():
+    """Return (stylesheet, logo PNG bytes), building them on first use"""
+    global _assets
+    with _assets_lock:
+        if _assets is None:
+            import markdown  # Unused here; imported so a warm-up covers message rendering too
+            _assets = (_build_styles(), _build_logo())
+        return _assets
+
+_flowables = OrderedDict()  # content hash -> parsed Paragraph used as a template
+_flowables_lock = threading.Lock()
+
+def conversation_digest(messages, username="User"):
+    """Stable hash of what an export would contain"""
+    payload = json.dumps(
+        [username] + [[m["role"], m["content"]] for m in messages], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _message_paragraph(role, content):
+    """Rendered paragraph for one message, reusing earlier renders of the same content"""
+    from reportlab.platypus import Paragraph
+    key = hashlib.sha256(f"{role}\0{content}".encode("utf-8")).hexdigest()
+    with _flowables_lock:
+        template = _flowables.get(key)
+        if template is not None:
+            _flowables.move_to_end(key)
+
+    if template is None:
+        import markdown
+        styles, _ = load_assets()
+        md_content = markdown.markdown(content)
+        if role == "user":
+            template = Paragraph(f"<b>You:</b> {md_content}", styles['User'])
+        else:
+            template = Paragraph(f"<b>Hermes:</b> {md_content}", styles['Assistant'])
+        with _flowables_lock:
+            _flowables[key] = template
+            while len(_flowables) > Config.PDF_FLOWABLE_CACHE_SIZE:
+                _flowables.popitem(last=False)
+
+    # Layout state lives on the Paragraph, so each build gets its own
+    # instance sharing the already-parsed fragments
+    return Paragraph(template.text, template.style, template.bulletText, frags=template.frags)
+
+@traced("pdf.export")
+def export_conversation_to_pdf(messages, username="User"):
+    """Export conversation to PDF with improved formatting"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+    styles, logo_png = load_assets()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=0.5*inch,
+        leftMargin=0.5*inch,
+        topMargin=0.75*inch,
+        bottomMargin=0.75*inch
+    )
+
+    story = []
+
+    # Add logo if available
+    if logo_png is not None:
+        story.append(Image(io.BytesIO(logo_png), width=2*inch, height=0.6*inch))
+
     # Add title
     title = Paragraph("Hermes Research Assistant", styles['Header'])
     story.append(title)
-    
+
     # Add metadata
     current_date = datetime.now().strftime("%Y-%m-%d %H:%M")
     metadata = Paragraph(f"Conversation exported on {current_date} for {username}", styles['Subheader'])
     story.append(metadata)
     story.append(Spacer(1, 24))
-    
+
     # Add conversation
     for message in messages:
-        if message["role"] == "user":
-            md_content = markdown.markdown(message['content'])
-            content = f"<b>You:</b> {md_content}"
-            story.append(Paragraph(content, styles['User']))
-        else:
-            md_content = markdown.markdown(message['content'])
-            content = f"<b>Hermes:</b> {md_content}"
-            story.append(Paragraph(content, styles['Assistant']))
+        story.append(_message_paragraph(message["role"], message["content"]))
         story.append(Spacer(1, 12))
-    
+
     # Add footer
     footer = Paragraph("Generated by Hermes Research Assistant", styles['Footer'])
     story.append(Spacer(1, 36))
     story.append(footer)
-    
+
     doc.build(story)
-    
+
     # Get PDF data
     pdf_data = buffer.getvalue()
     buffer.close()
-    
+
     return pdf_data
 
 
-def get_pdf_download_link(pdf_data, filename="research_conversation.pdf"):
-    """Generate a download link for PDF data"""
-    b64_pdf = base64.b64encode(pdf_data).decode('utf-8')
-    href = f'<a href="data:application/pdf;base64,{b64_pdf}" download="{filename}" class="download-btn">Download PDF</a>'
-    return href
\ No newline at end of file
+class PdfExporter:
+    """Builds PDFs on a background pool and keeps the most recent results"""
+
+    def __init__(self, workers=None, max_results=None):
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers or Config.PDF_EXPORT_WORKERS, thread_name_prefix="pdf"
+        )
+        self.max_results = max_results or Config.PDF_RESULT_CACHE_SIZE
+        self._results = OrderedDict()  # digest -> Future of the PDF bytes
+        self._lock = threading.Lock()
+
+    def submit(self, messages, username="User"):
+        """Return a Future of the PDF bytes, shared with any identical export"""
+        digest = conversation_digest(messages, username)
+        with self._lock:
+            future = self._results.get(digest)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self._results.move_to_end(digest)
+                return future
+            # Snapshot the messages; the caller may keep appending to its list
+            snapshot = [{"role": m["role"], "content": m["content"]} for m in messages]
+            future = self._results[digest] = self._pool.submit(export_conversation_to_pdf, snapshot, username)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+            return future
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+def get_pdf_exporter():
+    """Return the process-wide PDF exporter"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = PdfExporter()
+        return _exporter
@@ -1,19 +1,61 @@
 import os
-from langchain.tools import DuckDuckGoSearchRun
+import re
+from concurrent.futures import ThreadPoolExecutor
+from langchain.tools import Tool
 from langchain.agents import initialize_agent, AgentType
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import MessagesPlaceholder
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import SystemMessage
+from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
 from langchain_google_genai import ChatGoogleGenerativeAI
+from agent_memory import PersistentSummaryMemory
 from config import Config
+from metrics import add_usage, record_usage, span, usage_from_message
+from model_registry import GeneratedText
+from retrieval import get_document_index
+from search_cache import CachedSearchBackend
+
+def format_results(results):
+    """Render search results as numbered, citable text blocks"""
+    return "\n\n".join(
+        f"[{i}] {result.get('title', '')}\nURL: {result.get('link', '')}\n{result.get('snippet', '')}"
+        for i, result in enumerate(results, 1)
+    )
+
+class UsageCallback(BaseCallbackHandler):
+    """Sums token usage over every LLM call an agent run makes"""
 
-class ResearchAgent:
     def __init__(self):
+        self.usage = None
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                self.usage = add_usage(self.usage, usage_from_message(getattr(generation, "message", None)))
+
+class ResearchAgent:
+    def __init__(self, search_backend=None, document_index=None, username=None, raise_errors=False):
         self.config = Config()
-        self.search_tool = DuckDuckGoSearchRun()
+        # Batch jobs retry failed calls themselves, so they need the exception, not an error answer
+        self.raise_errors = raise_errors
+        # Any object with results(query, max_results) -> [{"title", "link", "snippet"}]
+        self.search_backend = search_backend or DuckDuckGoSearchAPIWrapper()
+        if self.config.SEARCH_CACHE_ENABLED:
+            self.search_backend = CachedSearchBackend(self.search_backend)
+        self.search_tool = Tool(
+            name="duckduckgo_search",
+            description="Search the web. Useful for finding current information and source URLs. "
+                        "Input should be a search query.",
+            func=self._search_text
+        )
+        self.document_index = document_index
+        if self.document_index is None and self.config.RAG_ENABLED:
+            self.document_index = get_document_index()
         self.llm = self._initialize_llm()
-        self.memory = ConversationBufferMemory(return_messages=True, memory_key="chat_history")
+        self.username = username
+        self.memory = PersistentSummaryMemory.for_user(self.llm, username)
         self.agent = self._initialize_agent()
+        self.last_usage = None  # Token counts of the latest research call
        
     def _initialize_llm(self):
         """Initialize the Gemini model for LangChain usage"""
@@ -24,6 +66,17 @@ class ResearchAgent:
             convert_system_message_to_human=True
         )
    
+    def _search(self, query):
+        """Run one search, treating backend errors as an empty result"""
+        try:
+            with span("search_tool"):
+                return self.search_backend.results(query, self.config.RESEARCH_RESULTS_PER_QUERY)
+        except Exception:
+            return []
+    
+    def _search_text(self, query):
+        return format_results(self._search(query)) or "No results found."
+    
     def _initialize_agent(self):
         """Initialize the LangChain agent with tools"""
         tools = [self.search_tool]
@@ -46,8 +99,54 @@ Format your responses with markdown and structure them well."""
             }
         )
    
+    def _invoke(self, prompt):
+        """Call the chat model, counting its tokens toward the current research call"""
+        message = self.llm.invoke(prompt)
+        usage = usage_from_message(message)
+        record_usage(self.config.MODEL_NAMES[0], usage)
+        self.last_usage = add_usage(self.last_usage, usage)
+        return message.content
+    
+    def _search_index(self, query):
+        if self.document_index is None:
+            return []
+        try:
+            with span("retrieve_local"):
+                return self.document_index.search(query)
+        except Exception:
+            return []
+    
+    def retrieve_local(self, query):
+        """Top-k indexed chunks for the query, or [] when too few are relevant"""
+        chunks = self._search_index(query)
+        return chunks if len(chunks) >= self.config.RAG_MIN_LOCAL_CHUNKS else []
+    
+    def ingest_results(self, results):
+        """Index the pages behind fresh search results for future questions"""
+        if self.document_index is None:
+            return
+        try:
+            self.document_index.ingest(results)
+        except Exception:
+            pass
+    
     def research(self, query):
         """Perform research on a topic with citations"""
+        self.last_usage = None
+        with span("research"):
+            return self._answer(self._research(query))
+    
+    def _answer(self, text):
+        """Attach the call's token usage so coalesced callers see it too"""
+        answer = GeneratedText(text)
+        answer.usage = self.last_usage
+        return answer
+    
+    def _research(self, query):
+        local = self.retrieve_local(query)
+        if local:
+            return self._synthesize(query, local)
+        
         structured_query = f"""Research the following topic and provide detailed information with proper citations:
         {query}
        
@@ -60,7 +159,88 @@ Format your responses with markdown and structure them well."""
         For each fact or claim, include a citation to a specific source URL in [Source: URL] format.
         """
        
+        counter = UsageCallback()
+        try:
+            return self.agent.run(structured_query, callbacks=[counter])
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            return f"Error performing research: {str(e)}"
+        finally:
+            record_usage(self.config.MODEL_NAMES[0], counter.usage)
+            self.last_usage = add_usage(self.last_usage, counter.usage)
+    
+    def plan_queries(self, query, count=None):
+        """Ask the LLM for several focused web searches in a single call"""
+        count = count or self.config.RESEARCH_SUBQUERIES
+        prompt = f"""Break the following research topic into at most {count} distinct web search queries
+that together cover its key findings, relevant studies, current challenges and future directions.
+Return one query per line with no numbering or commentary.
+
+Topic: {query}"""
+        lines = self._invoke(prompt).splitlines()
+        queries = []
+        for line in lines:
+            # Strip any list markers the model adds anyway
+            line = re.sub(r"^\s*(?:[-*\u2022]|\d+[.)])\s*", "", line).strip().strip('"')
+            if line and line.lower() not in (q.lower() for q in queries):
+                queries.append(line)
+        return queries[:count] or [query]
+    
+    def search_all(self, queries):
+        """Run searches concurrently and de-duplicate the results by URL"""
+        workers = max(1, min(self.config.RESEARCH_SEARCH_CONCURRENCY, len(queries)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            batches = list(pool.map(self._search, queries))
+        
+        seen = set()
+        results = []
+        for batch in batches:
+            for result in batch:
+                url = result.get("link")
+                if not url or url in seen:
+                    continue
+                seen.add(url)
+                results.append(result)
+        return results
+    
+    def research_parallel(self, query):
+        """Plan sub-queries, search them all at once, then synthesize one answer"""
+        self.last_usage = None
+        with span("research_parallel"):
+            results = self.retrieve_local(query)
+            if not results:
+                with span("plan_queries"):
+                    queries = self.plan_queries(query)
+                results = self.search_all(queries)
+                self.ingest_results(results)
+                # Prefer full-page chunks over snippets now that the pages are indexed
+                results = self._search_index(query) + results
+            return self._answer(self._synthesize(query, results))
+    
+    def _synthesize(self, query, results):
+        """Write one cited answer from retrieved chunks or search results"""
+        prompt = f"""Research the following topic using only the numbered search results below:
+        {query}
+        
+        Search results:
+        {format_results(results) or "No results were found."}
+        
+        Structure your response with:
+        1. Key Findings (bullet points)
+        2. Relevant Studies (with citations to specific sources)
+        3. Current Challenges
+        4. Future Directions
+        
+        For each fact or claim, include a citation to a specific source URL in [Source: URL] format.
+        """
+        
         try:
-            return self.agent.run(structured_query)
+            with span("synthesize"):
+                answer = self._invoke(prompt)
         except Exception as e:
-            return f"Error performing research: {str(e)}"
\ No newline at end of file
+            if self.raise_errors:
+                raise
+            return f"Error performing research: {str(e)}"
+        self.memory.save_context({"input": query}, {"output": answer})
+        return answer
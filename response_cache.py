@@ -0,0 +1,85 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import events
+from config import Config
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide cache of serialized API responses"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header names etag (weak comparison, as RFC 9110 asks for GET)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+class ResponseCache:
+    """Serialized conversation payloads with ETags, keyed on a change-version counter.
+
+    Every conversation write in this process bumps `version`, which drops
+    the cached payloads and changes every ETag. A TTL only bounds
+    staleness from writes made by other processes, such as the Streamlit
+    app, whose changes show up as a new body digest in the ETag.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or Config.RESPONSE_CACHE_SIZE
+        self.ttl = ttl or Config.RESPONSE_CACHE_TTL
+        self.version = 0
+        self._entries = OrderedDict()  # key -> (version, etag, body, cached_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        for event in ("conversation_saved", "conversation_deleted", "conversations_archived",
+                      "conversations_imported", "likes_applied"):
+            events.subscribe(event, self.bump)
+
+    def bump(self, **_):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def lookup(self, key):
+        """(etag, body) if a current payload is cached for key, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == self.version and time.monotonic() - entry[3] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+            return None
+
+    def store(self, key, version, body):
+        """Cache body loaded at `version`; returns (etag, body)"""
+        etag = f'"{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        with self._lock:
+            # Don't cache a payload that a write raced past
+            if version == self.version:
+                self._entries[key] = (version, etag, body, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag, body
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,254 @@
+import ipaddress
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from lxml import html as lxml_html
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from config import Config
+from database import migrate
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_document_index(db_name='research_chat.db'):
+    """Return the process-wide document index shared by every research agent"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DocumentIndex(db_name)
+        return _index
+
+
+def check_public_url(url):
+    """Raise ValueError unless url is http(s) and its host resolves only to public addresses"""
+    # Search results are untrusted input, and whatever is fetched ends up quoted in answers
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme.lower() not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Refusing to fetch {url!r}: only http and https URLs are allowed")
+    for info in socket.getaddrinfo(parts.hostname, parts.port or None, proto=socket.IPPROTO_TCP):
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global:
+            raise ValueError(f"Refusing to fetch {url!r}: {address} is not a public address")
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path, blocking until other processes release it"""
+    with open(path, "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        yield  # Released when the handle closes
+
+
+class PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Apply check_public_url to every redirect target too"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_public_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(PublicRedirectHandler)
+
+
+def http_fetch(url, timeout=None):
+    """Fetch a public http(s) URL and return its decoded body"""
+    check_public_url(url)
+    request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0 (Hermes Research Assistant)"})
+    with _opener.open(request, timeout=timeout or Config.RAG_FETCH_TIMEOUT) as response:
+        charset = response.headers.get_content_charset() or "utf-8"
+        return response.read(Config.RAG_MAX_PAGE_BYTES).decode(charset, errors="replace")
+
+
+def extract_text(page):
+    """Strip markup, scripts and navigation chrome from an HTML page"""
+    try:
+        tree = lxml_html.fromstring(page)
+    except Exception:
+        return page
+    for element in tree.xpath("//script|//style|//noscript|//nav|//header|//footer"):
+        element.drop_tree()
+    return " ".join(tree.text_content().split())
+
+
+class PageFetcher:
+    """Fetch many pages concurrently; fetch_fn can point at a local HTTP stand-in"""
+
+    def __init__(self, fetch_fn=None, concurrency=None):
+        self.fetch_fn = fetch_fn or http_fetch
+        self.concurrency = concurrency or Config.RAG_FETCH_CONCURRENCY
+
+    def _fetch_one(self, url):
+        try:
+            return url, extract_text(self.fetch_fn(url))
+        except Exception:
+            return url, None
+
+    def fetch_all(self, urls):
+        """Return {url: text} for every page that could be fetched"""
+        if not urls:
+            return {}
+        workers = max(1, min(self.concurrency, len(urls)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return {url: text for url, text in pool.map(self._fetch_one, urls) if text}
+
+
+class DocumentIndex:
+    """Chunked source pages embedded into a persistent FAISS index"""
+
+    def __init__(self, db_name='research_chat.db', index_path=None, embeddings=None, fetcher=None):
+        self.config = Config()
+        self.index_path = index_path or self.config.RAG_INDEX_PATH
+        self._embeddings = embeddings
+        self._embeddings_error = None
+        self.fetcher = fetcher or PageFetcher()
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.config.RAG_CHUNK_SIZE,
+            chunk_overlap=self.config.RAG_CHUNK_OVERLAP
+        )
+        migrate(db_name)
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.index = None
+        self._index_version = None
+        self._reload_index()
+
+    @property
+    def embeddings(self):
+        """Load the local embedding model on first use; a failed load is not retried"""
+        if self._embeddings is None:
+            if self._embeddings_error is not None:
+                raise RuntimeError(self._embeddings_error)
+            try:
+                from langchain_huggingface import HuggingFaceEmbeddings
+                self._embeddings = HuggingFaceEmbeddings(model_name=self.config.RAG_EMBEDDING_MODEL)
+            except Exception as e:
+                # Usually sentence-transformers missing; fail fast from now on rather than per query
+                self._embeddings_error = f"Embedding model unavailable: {str(e)}"
+                raise RuntimeError(self._embeddings_error) from e
+        return self._embeddings
+
+    def _embed(self, texts, query=False):
+        """Embed texts in batches into normalized float32 vectors"""
+        if query:
+            vectors = [self.embeddings.embed_query(texts[0])]
+        else:
+            vectors = []
+            batch_size = self.config.RAG_EMBED_BATCH_SIZE
+            for start in range(0, len(texts), batch_size):
+                vectors.extend(self.embeddings.embed_documents(texts[start:start + batch_size]))
+        array = np.array(vectors, dtype=np.float32)
+        faiss.normalize_L2(array)
+        return array
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _reload_index(self):
+        """Pick up the index file again if another process has rewritten it since"""
+        version = self._file_version()
+        if version is not None and version != self._index_version:
+            self.index = faiss.read_index(self.index_path)
+            self._index_version = version
+
+    def _add_vectors(self, vectors, ids):
+        """Add vectors to the shared index file, merging what other processes added first"""
+        # The GUI and the API each hold an index; writing ours without the
+        # other's latest file would silently drop the vectors it added
+        with file_lock(self.index_path + ".lock"):
+            self._reload_index()
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+            self.index.add_with_ids(vectors, ids)
+            # Written atomically so a crash never leaves a torn file
+            temp_path = self.index_path + ".tmp"
+            faiss.write_index(self.index, temp_path)
+            os.replace(temp_path, self.index_path)
+            self._index_version = self._file_version()
+
+    def _unindexed(self, urls):
+        if not urls:
+            return []
+        with self._lock:
+            known = {row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT url FROM document_chunks WHERE url IN ({','.join('?' * len(urls))})",
+                urls
+            )}
+        return [url for url in urls if url not in known]
+
+    def ingest(self, results):
+        """Fetch, chunk and embed the pages behind new search results"""
+        titles = {result["link"]: result.get("title", "") for result in results if result.get("link")}
+        urls = self._unindexed(list(titles))
+        if not urls:
+            return 0
+        # Load the embedder first so pages are never fetched only to be thrown away
+        self.embeddings
+        pages = self.fetcher.fetch_all(urls)
+        chunks = [
+            (url, chunk)
+            for url, text in pages.items()
+            for chunk in self.splitter.split_text(text)
+        ]
+        if not chunks:
+            return 0
+
+        vectors = self._embed([chunk for _, chunk in chunks])
+        now = time.time()
+        with self._lock:
+            ids = []
+            for url, chunk in chunks:
+                cursor = self._conn.execute(
+                    "INSERT INTO document_chunks (url, title, content, created_at) VALUES (?, ?, ?, ?)",
+                    (url, titles[url], chunk, now)
+                )
+                ids.append(cursor.lastrowid)
+            self._add_vectors(vectors, np.array(ids, dtype=np.int64))
+            self._conn.commit()
+        return len(chunks)
+
+    def search(self, query, k=None, min_score=None):
+        """Return the top-k chunks as search-result dicts, best first"""
+        k = k or self.config.RAG_TOP_K
+        min_score = self.config.RAG_MIN_SCORE if min_score is None else min_score
+        with self._lock:
+            self._reload_index()
+        if self.index is None or self.index.ntotal == 0:
+            return []
+
+        vector = self._embed([query], query=True)
+        matches = []
+        with self._lock:
+            scores, ids = self.index.search(vector, k)
+            for score, chunk_id in zip(scores[0], ids[0]):
+                if chunk_id == -1 or score < min_score:
+                    continue
+                row = self._conn.execute(
+                    "SELECT url, title, content FROM document_chunks WHERE id = ?", (int(chunk_id),)
+                ).fetchone()
+                if row:
+                    matches.append({"link": row[0], "title": row[1], "snippet": row[2], "score": float(score)})
+        return matches
@@ -0,0 +1,97 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from config import Config
+from database import migrate
+
+RouteDecision = namedtuple("RouteDecision", ["route", "model", "max_output_tokens", "score", "features"])
+
+DEFINITIONAL = re.compile(
+    r"^\s*(what\s+(is|are|was|were)|who\s+(is|was|were)|when\s+(is|was|did)|where\s+(is|was)"
+    r"|define|definition\s+of|meaning\s+of)\b",
+    re.IGNORECASE
+)
+ENUMERATED = re.compile(r"(^|\n)\s*(\d+[.)]|[-*•])\s")
+# nltk's wordpunct_tokenize pattern, without importing all of nltk
+WORD_PUNCT = re.compile(r"\w+|[^\w\s]+")
+COMPLEX_TERMS = {
+    "compare", "comparison", "versus", "vs", "contrast", "evaluate", "analyze", "analyse",
+    "review", "literature", "implications", "tradeoffs", "mechanism", "mechanisms",
+    "systematic", "meta", "relationship", "why", "how", "critique", "assess",
+}
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router(db_name='research_chat.db'):
+    """Return the process-wide query router"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = QueryRouter(db_name)
+        return _router
+
+
+def extract_features(query):
+    """Cheap lexical signals of how much reasoning a query needs"""
+    tokens = [token.lower() for token in WORD_PUNCT.findall(query)]
+    words = [token for token in tokens if token.isalpha()]
+    return {
+        "words": len(words),
+        "questions": query.count("?"),
+        "clauses": sum(1 for token in tokens if token in {",", ";", "and", "or"}),
+        "complex_terms": sum(1 for word in words if word in COMPLEX_TERMS),
+        "definitional": bool(DEFINITIONAL.match(query)),
+        "enumerated": bool(ENUMERATED.search(query)),
+    }
+
+
+def complexity_score(features):
+    """Weighted sum of the features; higher means route to the stronger model"""
+    return (
+        min(features["words"], 60) / 20
+        + max(features["questions"] - 1, 0)
+        + 0.5 * features["clauses"]
+        + features["complex_terms"]
+        + (1.5 if features["enumerated"] else 0)
+        - (2.0 if features["definitional"] else 0)
+    )
+
+
+class QueryRouter:
+    """Send short factual queries to a fast model and complex ones to a strong one"""
+
+    def __init__(self, db_name='research_chat.db', config=Config):
+        self.config = config
+        migrate(db_name)
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def route(self, query):
+        features = extract_features(query)
+        score = complexity_score(features)
+        route = "complex" if score >= self.config.ROUTING_COMPLEXITY_THRESHOLD else "simple"
+        target = self.config.ROUTES[route]
+        return RouteDecision(route, target["model"], target["max_output_tokens"], score, features)
+
+    def generation_config(self, decision):
+        """GENERATION_CONFIG with the route's output token cap"""
+        return dict(self.config.GENERATION_CONFIG, max_output_tokens=decision.max_output_tokens)
+
+    def log(self, decision, model_used, latency, first_token_latency=None):
+        """Record a routing decision and its latency for offline policy evaluation"""
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO routing_log
+                   (route, score, features, model_requested, model_used, latency_ms, first_token_ms, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (decision.route, decision.score, json.dumps(decision.features), decision.model,
+                 model_used, latency * 1000,
+                 first_token_latency * 1000 if first_token_latency is not None else None,
+                 int(time.time()))
+            )
+            self._conn.commit()
@@ -0,0 +1,77 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from config import Config
+from database import migrate
+
+def normalize_query(query):
+    """Collapse case, whitespace and trailing punctuation so equivalent queries share a key"""
+    return re.sub(r"\s+", " ", query).strip().strip("?!.").lower()
+
+class CachedSearchBackend:
+    """Disk-backed TTL/LRU cache in front of a search backend's results()"""
+    
+    def __init__(self, backend, db_name='research_chat.db', ttl=None, max_entries=None):
+        self.backend = backend
+        self.ttl = ttl or Config.SEARCH_CACHE_TTL
+        self.max_entries = max_entries or Config.SEARCH_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        migrate(db_name)
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._lock = threading.Lock()
+    
+    def stats(self):
+        """Hit/miss counters plus the current number of cached queries"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "stale_hits": self.stale_hits, "size": size}
+    
+    def results(self, query, max_results):
+        """Serve cached results when fresh, otherwise search and store them"""
+        key = f"{normalize_query(query)}|{max_results}"
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] < self.ttl:
+                self.hits += 1
+                self._conn.execute("UPDATE search_cache SET last_accessed = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                return json.loads(row[0])
+            self.misses += 1
+        
+        try:
+            results = self.backend.results(query, max_results)
+        except Exception:
+            if row is None:
+                raise
+            # Throttled or offline: an expired answer beats none
+            with self._lock:
+                self.stale_hits += 1
+            return json.loads(row[0])
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, results, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(results), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+        return results
+    
+    def _evict(self):
+        """Drop least recently used entries beyond the size limit.
+        
+        Expired entries are kept until then so they can stand in while throttled.
+        """
+        self._conn.execute(
+            """DELETE FROM search_cache WHERE key IN (
+                   SELECT key FROM search_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?
+               )""",
+            (self.max_entries,)
+        )
@@ -0,0 +1,155 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+import faiss
+import numpy as np
+import google.generativeai as genai
+from compression import register_functions
+from config import Config
+from database import migrate
+
+CacheHit = namedtuple("CacheHit", ["conversation_id", "response", "model_used", "score"])
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache(db_name='research_chat.db'):
+    """Return the process-wide semantic cache, shared by all sessions"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache(db_name)
+        return _cache
+
+
+@lru_cache(maxsize=256)
+def _embed(model_name, text):
+    """Embed text with Gemini, memoized so a miss does not embed twice"""
+    result = genai.embed_content(
+        model=model_name,
+        content=text,
+        task_type="semantic_similarity"
+    )
+    return tuple(result["embedding"])
+
+
+class SemanticCache:
+    """Embedding-based cache of answers, keyed on prompt similarity"""
+
+    SEARCH_K = 5
+
+    def __init__(self, db_name='research_chat.db'):
+        self.config = Config()
+        self.db_name = db_name
+        self._lock = threading.Lock()
+        migrate(db_name)
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        register_functions(self._conn, db_name)
+        self.index = None
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the in-memory FAISS index from stored vectors"""
+        rows = self._conn.execute(
+            "SELECT conversation_id, embedding FROM prompt_embeddings WHERE created_at >= ?",
+            (time.time() - self.config.SEMANTIC_CACHE_TTL,)
+        ).fetchall()
+        if not rows:
+            return
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        vectors = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        self._ensure_index(vectors.shape[1])
+        self.index.add_with_ids(vectors, ids)
+
+    def _ensure_index(self, dim):
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    def _vectorize(self, text):
+        """Return a normalized float32 row vector for the text"""
+        vector = np.array([_embed(self.config.SEMANTIC_CACHE_EMBEDDING_MODEL, text.strip().lower())],
+                          dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _remove(self, conv_ids):
+        """Drop entries from both the index and the table (caller holds the lock)"""
+        if not conv_ids:
+            return
+        if self.index is not None:
+            self.index.remove_ids(np.array(conv_ids, dtype=np.int64))
+        self._conn.executemany(
+            "DELETE FROM prompt_embeddings WHERE conversation_id = ?",
+            [(conv_id,) for conv_id in conv_ids]
+        )
+        self._conn.commit()
+
+    def lookup(self, query, mode="standard"):
+        """Return a CacheHit for a similar earlier query, or None"""
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return None  # A cold cache can't hit, so skip the embedding round trip
+        vector = self._vectorize(query)
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return None
+
+            scores, ids = self.index.search(vector, self.SEARCH_K)
+            stale = []
+            hit = None
+            for score, conv_id in zip(scores[0], ids[0]):
+                if conv_id == -1 or score < self.config.SEMANTIC_CACHE_THRESHOLD:
+                    break
+                row = self._conn.execute(
+                    """SELECT hermes_decompress(c.response), c.model_used, c.likes, e.mode, e.created_at
+                       FROM prompt_embeddings e
+                       JOIN conversations c ON c.id = e.conversation_id
+                       WHERE e.conversation_id = ?""",
+                    (int(conv_id),)
+                ).fetchone()
+                if row is None or time.time() - row[4] > self.config.SEMANTIC_CACHE_TTL:
+                    # Conversation deleted elsewhere or entry expired
+                    stale.append(int(conv_id))
+                    continue
+                response, model_used, likes, entry_mode, _ = row
+                if entry_mode != mode or (likes or 0) < self.config.SEMANTIC_CACHE_MIN_LIKES:
+                    continue
+                hit = CacheHit(int(conv_id), response, model_used, float(score))
+                break
+
+            self._remove(stale)
+            return hit
+
+    def add(self, conv_id, query, mode="standard"):
+        """Store the prompt vector for a freshly generated conversation"""
+        vector = self._vectorize(query)
+        with self._lock:
+            self._ensure_index(vector.shape[1])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prompt_embeddings (conversation_id, mode, embedding, created_at) VALUES (?, ?, ?, ?)",
+                (conv_id, mode, vector.tobytes(), time.time())
+            )
+            self._conn.commit()
+            self.index.remove_ids(np.array([conv_id], dtype=np.int64))
+            self.index.add_with_ids(vector, np.array([conv_id], dtype=np.int64))
+            self._evict()
+
+    def _evict(self):
+        """Apply TTL expiry and the size bound, oldest entries first"""
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT conversation_id FROM prompt_embeddings WHERE created_at < ?",
+            (time.time() - self.config.SEMANTIC_CACHE_TTL,)
+        )]
+        self._remove(expired)
+
+        overflow = self.index.ntotal - self.config.SEMANTIC_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            oldest = [row[0] for row in self._conn.execute(
+                "SELECT conversation_id FROM prompt_embeddings ORDER BY created_at LIMIT ?",
+                (overflow,)
+            )]
+            self._remove(oldest)
@@ -0,0 +1,147 @@
+import threading
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """One upstream stream replayed to every subscriber, late joiners included"""
+
+    def __init__(self):
+        self.chunks = []
+        self.meta = None
+        self.usage = None
+        self.error = None
+        self.done = False
+        self.started = threading.Event()
+        self.cond = threading.Condition()
+
+    def subscribe(self):
+        position = 0
+        while True:
+            with self.cond:
+                while position >= len(self.chunks) and not self.done:
+                    self.cond.wait()
+                if position < len(self.chunks):
+                    chunk = self.chunks[position]
+                    position += 1
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            yield chunk
+
+
+class _Subscription:
+    """One subscriber's chunk iterator; usage is the upstream's once the stream ends"""
+
+    def __init__(self, broadcast):
+        self._broadcast = broadcast
+        self._chunks = broadcast.subscribe()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    @property
+    def usage(self):
+        return self._broadcast.usage
+
+
+class SingleFlight:
+    """Process-wide coalescing of identical in-flight calls onto one upstream request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "upstream_calls": self.upstream_calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._streams),
+            }
+
+    def do(self, key, fn):
+        """Run fn once for concurrent callers sharing a key; all get its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.upstream_calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def do_stream(self, key, open_fn):
+        """Share one upstream stream among concurrent callers.
+
+        open_fn returns (meta, chunk iterator), meta being e.g. the model name.
+        The upstream is drained on a background thread so an abandoned
+        subscriber never stalls the others. Returns (meta, chunk iterator).
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._streams[key] = _Broadcast()
+                self.upstream_calls += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            threading.Thread(target=self._pump, args=(key, broadcast, open_fn), daemon=True).start()
+
+        broadcast.started.wait()
+        if broadcast.meta is None:
+            raise broadcast.error
+        return broadcast.meta, _Subscription(broadcast)
+
+    def _pump(self, key, broadcast, open_fn):
+        try:
+            broadcast.meta, chunks = open_fn()
+            broadcast.started.set()
+            for chunk in chunks:
+                with broadcast.cond:
+                    broadcast.chunks.append(chunk)
+                    broadcast.cond.notify_all()
+            broadcast.usage = getattr(chunks, "usage", None)
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            with self._lock:
+                del self._streams[key]
+            with broadcast.cond:
+                broadcast.done = True
+                broadcast.cond.notify_all()
+            broadcast.started.set()
+
+
+# Shared by every session and request handler in the process
+generation_flight = SingleFlight()
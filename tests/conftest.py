@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import migrate
+
+
+@pytest.fixture(autouse=True)
+def no_background_threads(monkeypatch):
+    """Keep maintenance and recompression threads out of unit tests"""
+    monkeypatch.setattr(Config, "MAINTENANCE_ENABLED", False)
+    monkeypatch.setattr(Config, "RESPONSE_COMPRESSION", "none")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A migrated scratch database"""
+    path = str(tmp_path / "test.db")
+    migrate(path)
+    return path
+
+
+@pytest.fixture
+def add_conversation(db_path):
+    """Insert a conversation straight into the scratch database; returns its id"""
+    def add(query="q", likes=0):
+        conn = sqlite3.connect(db_path)
+        with conn:
+            conv_id = conn.execute(
+                "INSERT INTO conversations (query, response, timestamp, likes, model_used) VALUES (?, 'r', 1, ?, 'm')",
+                (query, likes)
+            ).lastrowid
+        conn.close()
+        return conv_id
+    return add
+
+
+@pytest.fixture
+def query_one(db_path):
+    """Run one query against the scratch database and return its first row"""
+    def query(sql, params=()):
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute(sql, params).fetchone()
+        finally:
+            conn.close()
+    return query
@@ -0,0 +1,20 @@
+import pytest
+
+import agent_memory
+
+fake = pytest.importorskip("langchain_core.language_models.fake")
+
+
+def test_memory_migrates_once_and_reuses_its_connection(db_path, monkeypatch):
+    migrations = []
+    monkeypatch.setattr(agent_memory, "migrate", migrations.append)
+    memory = agent_memory.PersistentSummaryMemory.for_user(fake.FakeListLLM(responses=["summary"]), "alice", db_path)
+    memory.save_context({"input": "What is CRISPR?"}, {"output": "Gene editing."})
+    memory.save_context({"input": "Who found it?"}, {"output": "Doudna and Charpentier."})
+    assert migrations == [db_path]
+    conn = memory._get_connection()
+    memory.restore()
+    assert memory._get_connection() is conn
+
+    restored = agent_memory.PersistentSummaryMemory.for_user(fake.FakeListLLM(responses=["summary"]), "alice", db_path)
+    assert [message.content for message in restored.chat_memory.messages][-1] == "Doudna and Charpentier."
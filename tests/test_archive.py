@@ -0,0 +1,35 @@
+import sqlite3
+
+import database
+from archive import archive_path, ensure_archive
+
+
+def test_archived_ids_are_reserved_once_by_the_autoincrement_migration(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "old.db")
+    # A database from before AUTOINCREMENT, with an archive holding a higher id
+    with monkeypatch.context() as patch:
+        patch.setattr(database, "MIGRATIONS", [m for m in database.MIGRATIONS if m[0] < 15])
+        database.migrate(db_path)
+    ensure_archive(db_path)
+    archive = sqlite3.connect(archive_path(db_path))
+    with archive:
+        archive.execute("INSERT INTO conversations (id, query, response, timestamp) VALUES (50, 'old', 'r', 1)")
+    archive.close()
+
+    def sequence():
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'conversations'").fetchone()
+        finally:
+            conn.close()
+
+    database.migrate(db_path)
+    assert sequence() == (50,)
+
+    # Later calls never write to sqlite_sequence again; archive passes keep it ahead from here
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE sqlite_sequence SET seq = 10 WHERE name = 'conversations'")
+    conn.close()
+    database.migrate(db_path)
+    assert sequence() == (10,)
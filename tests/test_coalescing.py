@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import model_registry
+from benchmarks.fakes import FakeGenerativeModel, Latency
+from config import Config
+from model_registry import ModelRegistry
+
+gemini = pytest.importorskip("gemini")
+jobs = pytest.importorskip("jobs")
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A slow fake registry installed as the process-wide one"""
+    registry = ModelRegistry(
+        ["primary", "secondary"],
+        client_factory=lambda name: FakeGenerativeModel(name, latency=Latency("constant:0.2"))
+    )
+    monkeypatch.setattr(model_registry, "_registry", registry)
+    monkeypatch.setattr(Config, "HEDGING_ENABLED", False)
+    return registry
+
+
+def test_default_routing_shares_the_key_of_explicit_routing(registry):
+    prompt = gemini.build_research_prompt("CRISPR")
+    assert gemini.generation_key(prompt) == gemini.generation_key(
+        prompt.upper(), "primary", Config.GENERATION_CONFIG
+    )
+    assert gemini.generation_key(prompt) != gemini.generation_key(prompt, "secondary")
+    short = dict(Config.GENERATION_CONFIG, max_output_tokens=256)
+    assert gemini.generation_key(prompt) != gemini.generation_key(prompt, generation_config=short)
+
+
+def test_gui_and_batch_jobs_share_one_upstream_call(registry):
+    prompt = gemini.build_research_prompt("CRISPR")
+    runner = jobs.JobRunner(db=None)
+    with ThreadPoolExecutor(2) as pool:
+        gui = pool.submit(gemini.generate_coalesced, prompt, "primary", Config.GENERATION_CONFIG)
+        job = pool.submit(runner._generate, "CRISPR", "standard", None)
+        text, model_name, label = gui.result()
+        assert job.result() == (text, label)
+    assert (model_name, label) == ("primary", "primary")
+    assert registry.get_client("primary").calls == 1
@@ -0,0 +1,41 @@
+import zlib
+
+import pytest
+
+pytest.importorskip("faiss")
+
+from retrieval import DocumentIndex
+
+
+class FakeEmbeddings:
+    """Deterministic 16-dimensional vectors, no model download"""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = zlib.crc32(text.encode())
+        return [float((seed >> bit) & 1) + 0.1 for bit in range(16)]
+
+
+class FakeFetcher:
+    def fetch_all(self, urls):
+        return {url: f"Page about {url}" for url in urls}
+
+
+def make_index(db_path, index_path):
+    return DocumentIndex(db_path, index_path=index_path, embeddings=FakeEmbeddings(), fetcher=FakeFetcher())
+
+
+def test_processes_sharing_an_index_file_keep_each_others_vectors(db_path, tmp_path):
+    index_path = str(tmp_path / "rag.faiss")
+    gui = make_index(db_path, index_path)
+    api = make_index(db_path, index_path)
+
+    assert gui.ingest([{"link": "https://a.example/"}]) == 1
+    assert api.ingest([{"link": "https://b.example/"}]) == 1
+    assert gui.ingest([{"link": "https://c.example/"}]) == 1
+
+    assert make_index(db_path, index_path).index.ntotal == 3
+    # The other process's pages are searchable without a restart
+    assert "https://b.example/" in {match["link"] for match in gui.search("Page about https://b.example/", min_score=-1)}
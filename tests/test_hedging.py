@@ -0,0 +1,88 @@
+import inspect
+import time
+
+import pytest
+
+import model_registry
+from benchmarks.fakes import FakeGenerativeModel, Latency
+from config import Config
+from model_registry import ModelRegistry
+
+
+class HedgeConfig(Config):
+    HEDGE_DEFAULT_DELAY = 0.05
+    HEDGE_MIN_SAMPLES = 1000  # Keep using the default delay
+
+
+def make_registry(primary_latency, secondary_latency="constant:0"):
+    latencies = {"primary": primary_latency, "secondary": secondary_latency}
+    return ModelRegistry(
+        ["primary", "secondary"],
+        client_factory=lambda name: FakeGenerativeModel(name, latency=Latency(latencies[name])),
+        config=HedgeConfig
+    )
+
+
+def record_streams(registry):
+    """Keep every stream the registry opens, keyed by model"""
+    opened = {}
+    open_one = registry._open_one
+
+    def recording(model_name, prompt, kwargs):
+        opened[model_name] = open_one(model_name, prompt, kwargs)
+        return opened[model_name]
+
+    registry._open_one = recording
+    return opened
+
+
+def test_secondary_wins_when_the_primary_is_slow():
+    registry = make_registry("constant:0.5")
+    abandoned = []
+    cancel = registry._cancel
+    registry._cancel = lambda future: abandoned.append(future) or cancel(future)
+    started = time.monotonic()
+    text, model_name, label = registry.generate_hedged("topic")
+    assert time.monotonic() - started < 0.4
+    assert model_name == "secondary"
+    assert label == "secondary [hedged: secondary won]"
+    assert text
+    assert registry.hedge_stats["hedged"] == 1
+    assert registry.hedge_stats["secondary_wins"] == 1
+    # The slow primary is the abandoned call
+    assert len(abandoned) == 1
+    abandoned[0].result(timeout=2)
+    assert registry.get_client("primary").calls == 1
+
+
+def test_fast_primary_is_not_hedged():
+    registry = make_registry("constant:0")
+    _, model_name, label = registry.generate_hedged("topic")
+    assert (model_name, label) == ("primary", "primary")
+    assert registry.hedge_stats["hedged"] == 0
+
+
+def test_losing_stream_is_closed_once_it_arrives():
+    registry = make_registry("constant:0.3")
+    opened = record_streams(registry)
+
+    model_name, chunks, label = registry.open_stream_hedged("topic")
+    assert model_name == "secondary"
+    assert label == "secondary [hedged: secondary won]"
+    assert "".join(chunks)
+
+    deadline = time.monotonic() + 2
+    while "primary" not in opened and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)  # Let the done callback run
+    assert inspect.getgeneratorstate(opened["primary"]._chunks) == inspect.GEN_CLOSED
+
+
+def test_model_used_carries_the_hedge_label(monkeypatch):
+    gemini = pytest.importorskip("gemini")
+    monkeypatch.setattr(Config, "HEDGING_ENABLED", True)
+    monkeypatch.setattr(model_registry, "_registry", make_registry("constant:0.5"))
+
+    chunks, _, label = gemini.open_stream_coalesced("topic")
+    assert label == "secondary [hedged: secondary won]"
+    assert "".join(chunks)
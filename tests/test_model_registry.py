@@ -0,0 +1,135 @@
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeGenerativeModel
+from config import Config
+from model_registry import CircuitBreaker, ModelRegistry
+
+
+class RegistryConfig(Config):
+    MODEL_HEALTH_TTL = 600
+    CIRCUIT_FAILURE_THRESHOLD = 2
+    CIRCUIT_RESET_TIMEOUT = 0.05
+
+
+def make_registry(failure_rates=None, config=RegistryConfig):
+    """Registry over fake primary/secondary models; returns (registry, {name: fake client})"""
+    failure_rates = failure_rates or {}
+    clients = {}
+
+    def factory(model_name):
+        clients[model_name] = FakeGenerativeModel(model_name, failure_rate=failure_rates.get(model_name, 0.0))
+        return clients[model_name]
+
+    registry = ModelRegistry(["primary", "secondary"], client_factory=factory, config=config)
+    for name in registry.model_names:
+        registry.get_client(name)
+    return registry, clients
+
+
+def test_health_checks_are_cached_within_ttl():
+    registry, clients = make_registry()
+    assert registry.check_health("primary") == (True, None)
+    assert registry.check_health("primary") == (True, None)
+    assert clients["primary"].calls == 1
+
+
+def test_failed_health_check_is_cached_then_retried_after_ttl():
+    class ShortTtl(RegistryConfig):
+        MODEL_HEALTH_TTL = 0.05
+
+    registry, clients = make_registry({"primary": 1.0}, config=ShortTtl)
+    healthy, error = registry.check_health("primary")
+    assert not healthy and "simulated 503" in error
+    registry.check_health("primary")
+    assert clients["primary"].calls == 1
+
+    time.sleep(0.06)
+    clients["primary"].failure_rate = 0.0
+    assert registry.check_health("primary") == (True, None)
+    assert clients["primary"].calls == 2
+
+
+def test_generate_fails_over_to_the_next_model():
+    registry, clients = make_registry({"primary": 1.0})
+    text, model_name = registry.generate("topic")
+    assert model_name == "secondary"
+    assert text
+    assert clients["primary"].calls == 1
+
+
+def test_open_stream_fails_over_before_the_first_chunk():
+    registry, _ = make_registry({"primary": 1.0})
+    model_name, chunks = registry.open_stream("topic")
+    assert model_name == "secondary"
+    assert "".join(chunks)
+
+
+def test_generate_raises_only_when_every_model_fails():
+    registry, _ = make_registry({"primary": 1.0, "secondary": 1.0})
+    with pytest.raises(RuntimeError, match="All models failed"):
+        registry.generate("topic")
+
+
+def test_circuit_opens_half_opens_and_closes():
+    registry, clients = make_registry({"primary": 1.0})
+    breaker = registry.breaker("primary")
+
+    for _ in range(RegistryConfig.CIRCUIT_FAILURE_THRESHOLD):
+        registry.generate("topic")
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # While open, the primary is skipped entirely
+    calls = clients["primary"].calls
+    assert registry.generate("topic")[1] == "secondary"
+    assert clients["primary"].calls == calls
+
+    # After the reset timeout one trial call goes through; failing it reopens the circuit
+    time.sleep(RegistryConfig.CIRCUIT_RESET_TIMEOUT + 0.01)
+    assert registry.generate("topic")[1] == "secondary"
+    assert clients["primary"].calls == calls + 1
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # A successful trial closes it again
+    time.sleep(RegistryConfig.CIRCUIT_RESET_TIMEOUT + 0.01)
+    clients["primary"].failure_rate = 0.0
+    assert registry.generate("topic")[1] == "primary"
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_half_open_circuit_lets_a_single_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # Only one trial while it is in flight
+
+
+def test_recovering_model_behind_a_healthy_one_is_tried_on_failover():
+    clients = {}
+
+    def factory(model_name):
+        clients[model_name] = FakeGenerativeModel(model_name)
+        return clients[model_name]
+
+    registry = ModelRegistry(["a", "b", "c"], client_factory=factory, config=RegistryConfig)
+    breaker = registry.breaker("b")
+    for _ in range(RegistryConfig.CIRCUIT_FAILURE_THRESHOLD):
+        breaker.record_failure()
+    time.sleep(RegistryConfig.CIRCUIT_RESET_TIMEOUT + 0.01)
+
+    # "a" answers, so b's trial is never sent and its breaker must stay untouched
+    assert registry.generate("topic", preferred="a")[1] == "a"
+    assert registry.generate_hedged("topic", preferred="a")[1] == "a"
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Once "a" fails, the failover sends b its trial call, which closes the circuit
+    registry.get_client("a").failure_rate = 1.0
+    assert registry.generate("topic", preferred="a")[1] == "b"
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert "c" not in clients
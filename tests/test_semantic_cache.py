@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip("faiss")
+semantic_cache = pytest.importorskip("semantic_cache")
+
+
+def test_cold_cache_lookup_skips_the_embedding_call(db_path, add_conversation, monkeypatch):
+    calls = []
+
+    def fake_embed(model_name, text):
+        calls.append(text)
+        return (1.0, 0.0, 0.0, 0.0)
+
+    monkeypatch.setattr(semantic_cache, "_embed", fake_embed)
+    cache = semantic_cache.SemanticCache(db_path)
+    assert cache.lookup("What is CRISPR?") is None
+    assert calls == []
+
+    cache.add(add_conversation(likes=5), "What is CRISPR?")
+    assert cache.lookup("what is crispr?").response == "r"
+    assert len(calls) == 2
@@ -0,0 +1,40 @@
+import sqlite3
+
+from archive import archive_conversations, ensure_archive
+from config import Config
+from database import DatabaseManager
+
+
+def test_session_messages_reference_the_conversation_text(tmp_path, monkeypatch):
+    # A fresh file, as a database's codec is fixed once it is first opened
+    monkeypatch.setattr(Config, "RESPONSE_COMPRESSION", "zlib")
+    db_path = str(tmp_path / "sessions.db")
+    ensure_archive(db_path)
+
+    def query_one(sql, params=()):
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute(sql, params).fetchone()
+        finally:
+            conn.close()
+
+    db = DatabaseManager(db_path)
+    try:
+        response = "Findings. " * 200
+        conv_id = db.save_conversation("What is CRISPR?", response, "m")
+        session_id = db.create_session("alice", "CRISPR")
+        db.append_exchange(session_id, "What is CRISPR?", response, conv_id, "m")
+        db.append_exchange(session_id, "unsaved", "answer", None, "m")
+
+        # Only the unsaved turn keeps its own copy; the response is stored once, compressed
+        assert query_one("SELECT COUNT(*) FROM messages WHERE content IS NOT NULL") == (2,)
+        assert query_one("SELECT typeof(response) FROM conversations WHERE id = ?", (conv_id,)) == ("blob",)
+        expected = [("user", "What is CRISPR?", conv_id), ("assistant", response, conv_id),
+                    ("user", "unsaved", None), ("assistant", "answer", None)]
+        assert [row[1:] for row in db.get_session_messages(session_id)] == expected
+
+        # Still readable once the conversation has moved to the archive
+        assert archive_conversations(db_path, older_than=-10) == 1
+        assert [row[1:] for row in db.get_session_messages(session_id, limit=2, before=3)] == expected[:2]
+    finally:
+        db.close_all()
@@ -0,0 +1,194 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import write_behind
+from config import Config
+from write_behind import WriteBehindQueue
+
+
+def make_queue(db_path, journal_path=None):
+    return WriteBehindQueue(db_path, journal_path=journal_path or f"{db_path}.journal", flush_interval=60)
+
+
+def write_journal(path, records, torn=None):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        if torn:
+            f.write(torn)
+
+
+def test_unflushed_journal_is_replayed_on_start(db_path, add_conversation, query_one):
+    conv_id = add_conversation()
+    write_journal(f"{db_path}.journal", [
+        {"op": "like", "id": conv_id},
+        {"op": "like", "id": conv_id},
+        {"op": "insert", "query": "saved", "response": "text", "model_used": "m", "timestamp": 5, "usage": None},
+    ])
+
+    queue = make_queue(db_path)
+    queue.start()
+    queue.close()
+
+    assert query_one("SELECT likes FROM conversations WHERE id = ?", (conv_id,)) == (2,)
+    assert query_one("SELECT COUNT(*) FROM conversations WHERE query = 'saved'") == (1,)
+    assert not os.path.exists(f"{db_path}.journal")
+
+
+def test_torn_final_line_is_skipped(db_path, add_conversation, query_one):
+    conv_id = add_conversation()
+    write_journal(f"{db_path}.journal", [{"op": "like", "id": conv_id}], torn='{"op": "like", "i')
+
+    queue = make_queue(db_path)
+    queue.start()
+    queue.close()
+
+    assert query_one("SELECT likes FROM conversations WHERE id = ?", (conv_id,)) == (1,)
+
+
+def test_committed_batch_is_not_applied_twice(db_path, add_conversation, query_one):
+    conv_id = add_conversation()
+    queue = make_queue(db_path)
+    queue.start()
+    # Crash between the batch's commit and the removal of its journal
+    batch_id = "00000000000000000001-deadbeef"
+    write_journal(f"{db_path}.journal.{batch_id}", [{"op": "like", "id": conv_id}])
+    queue._apply(batch_id, {conv_id: 1}, [])
+    queue.close()
+
+    restarted = make_queue(db_path)
+    restarted.start()
+    restarted.close()
+
+    assert query_one("SELECT likes FROM conversations WHERE id = ?", (conv_id,)) == (1,)
+    assert not os.path.exists(f"{db_path}.journal.{batch_id}")
+
+
+def test_close_flushes_pending_writes(db_path, add_conversation, query_one):
+    conv_id = add_conversation()
+    queue = make_queue(db_path)
+    queue.start()
+    queue.like(conv_id)
+    queue.like(conv_id)
+    future = queue.save_conversation("pending", "text", "m")
+    queue.close()
+
+    assert query_one("SELECT likes FROM conversations WHERE id = ?", (conv_id,)) == (2,)
+    assert query_one("SELECT query FROM conversations WHERE id = ?", (future.result(timeout=5),)) == ("pending",)
+    assert not os.path.exists(f"{db_path}.journal")
+
+
+def test_processes_sharing_a_journal_name_get_separate_slots(db_path, add_conversation, query_one):
+    conv_id = add_conversation()
+    first = make_queue(db_path)
+    first.start()
+    second = make_queue(db_path)
+    second.start()
+    try:
+        assert first.journal_path != second.journal_path
+        # A third process starting must not replay the journals of live ones
+        first.like(conv_id)
+        third = make_queue(db_path)
+        third.start()
+        third.close()
+        assert query_one("SELECT likes FROM conversations WHERE id = ?", (conv_id,)) == (0,)
+    finally:
+        first.close()
+        second.close()
+    assert query_one("SELECT likes FROM conversations WHERE id = ?", (conv_id,)) == (1,)
+
+
+def test_orphaned_slot_is_replayed(db_path, add_conversation, query_one):
+    conv_id = add_conversation()
+    live = make_queue(db_path)
+    live.start()
+    try:
+        # A slot whose process died with an unflushed like
+        write_journal(f"{db_path}.journal-2", [{"op": "like", "id": conv_id}])
+        open(f"{db_path}.journal-2.lock", "a").close()
+
+        queue = make_queue(db_path)
+        queue.start()
+        queue.close()
+    finally:
+        live.close()
+    assert query_one("SELECT likes FROM conversations WHERE id = ?", (conv_id,)) == (1,)
+
+
+def test_failed_rotation_fails_the_save_and_keeps_the_writer_alive(db_path, query_one, monkeypatch):
+    queue = make_queue(db_path)
+    queue.start()
+    real_replace = write_behind.os.replace
+
+    def failing_replace(src, dst):
+        monkeypatch.setattr(write_behind.os, "replace", real_replace)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(write_behind.os, "replace", failing_replace)
+    with pytest.raises(OSError, match="disk full"):
+        queue.insert("lost", "text", "m", timeout=5)
+    assert query_one("SELECT query FROM conversations WHERE id = ?", (queue.insert("kept", "text", "m", timeout=5),)) == ("kept",)
+    queue.close()
+
+    # The save reported as failed is not replayed on the next start
+    restarted = make_queue(db_path)
+    restarted.start()
+    restarted.close()
+    assert query_one("SELECT COUNT(*) FROM conversations WHERE query = 'lost'") == (0,)
+
+
+def test_batch_out_of_retries_is_quarantined_not_replayed(db_path, add_conversation, query_one, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND_MAX_ATTEMPTS", 1)
+    conv_id = add_conversation()
+    queue = make_queue(db_path)
+    queue.start()
+    real_apply = queue._apply
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    queue._apply = locked
+    queue.like(conv_id)
+    with pytest.raises(sqlite3.OperationalError):
+        queue.insert("failed", "text", "m", timeout=5)
+    assert len(glob.glob(f"{db_path}.journal.*.failed")) == 1
+
+    # The like has no waiter, so it is retried; the failed insert is not
+    queue._apply = real_apply
+    queue.close()
+    restarted = make_queue(db_path)
+    restarted.start()
+    restarted.close()
+    assert query_one("SELECT likes FROM conversations WHERE id = ?", (conv_id,)) == (1,)
+    assert query_one("SELECT COUNT(*) FROM conversations WHERE query = 'failed'") == (0,)
+
+
+def test_save_that_times_out_is_dropped(db_path, query_one):
+    queue = make_queue(db_path)
+    queue.start()
+    release = threading.Event()
+    real_apply = queue._apply
+
+    def stalled_apply(*args):
+        release.wait(5)
+        return real_apply(*args)
+
+    queue._apply = stalled_apply
+    first = queue.save_conversation("first", "text", "m")
+    time.sleep(0.05)  # The writer is now stuck on the first batch
+    with pytest.raises(RuntimeError, match="Timed out"):
+        queue.insert("abandoned", "text", "m", timeout=0.05)
+    release.set()
+    first.result(timeout=5)
+    queue.close()
+
+    restarted = make_queue(db_path)
+    restarted.start()
+    restarted.close()
+    assert query_one("SELECT COUNT(*) FROM conversations WHERE query = 'abandoned'") == (0,)
@@ -0,0 +1,43 @@
+import importlib
+import threading
+from config import Config
+from metrics import span
+
+_started = False
+_lock = threading.Lock()
+
+
+def _load_semantic_cache():
+    semantic_cache = importlib.import_module("semantic_cache")
+    if Config.SEMANTIC_CACHE_ENABLED:
+        semantic_cache.get_semantic_cache()
+
+
+def _load_pdf_assets():
+    importlib.import_module("pdf").load_assets()
+
+
+STEPS = [
+    ("research_agent", lambda: importlib.import_module("research_agent")),
+    ("semantic_cache", _load_semantic_cache),
+    ("pdf", _load_pdf_assets),
+]
+
+
+def _warm_up():
+    for name, step in STEPS:
+        try:
+            with span(f"warmup.{name}"):
+                step()
+        except Exception:
+            pass  # The first real use reports the error to the user
+
+
+def start_warmup():
+    """Preload the lazily imported subsystems on a background thread, once per process"""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_warm_up, name="warmup", daemon=True).start()
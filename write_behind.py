@@ -0,0 +1,394 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import events
+from compression import get_response_codec, register_functions
+from config import Config
+from database import migrate
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("hermes.write_behind")
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_behind(db_name='research_chat.db', name='app'):
+    """Return the started process-wide write-behind queue for a database.
+
+    The name picks the journal file replayed on start; processes sharing a
+    name, such as API workers, each lock their own numbered slot of it.
+    """
+    with _queues_lock:
+        key = (db_name, name)
+        if key not in _queues:
+            queue = WriteBehindQueue(db_name, journal_path=f"{db_name}.{name}.journal")
+            queue.start()
+            _queues[key] = queue
+        return _queues[key]
+
+
+def _try_lock(path):
+    """Open path with an exclusive lock held until it is closed; None if another holder has it"""
+    handle = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+class WriteBehindQueue:
+    """Aggregates like increments and queues conversation inserts for one writer thread.
+
+    Every write is appended to a journal before it is acknowledged. The
+    journal is rotated into a per-batch file when a batch is taken and that
+    file is removed once the batch commits; leftovers are replayed on start.
+    Applied batch ids are recorded in the same transaction, so a replay
+    never double-counts a batch that committed just before a crash.
+    An insert whose caller was told it failed is never replayed: a batch
+    that runs out of retries is renamed to `.failed` and its likes are
+    queued again, and inserts dropped before reaching a batch are marked
+    with a discard record in the journal.
+
+    A journal belongs to whoever holds its .lock file. A queue whose
+    journal is held by another live process takes the next free
+    numbered slot (`<journal>-1`, `<journal>-2`, ...), and slots left
+    by dead processes are replayed by the next queue that starts.
+    """
+
+    def __init__(self, db_name='research_chat.db', journal_path=None, flush_interval=None,
+                 max_pending=None, fsync=None):
+        self.db_name = db_name
+        self.journal_path = journal_path or f"{db_name}.journal"
+        self.flush_interval = flush_interval or Config.WRITE_BEHIND_FLUSH_INTERVAL
+        self.max_pending = max_pending or Config.WRITE_BEHIND_MAX_PENDING
+        self.fsync = Config.WRITE_BEHIND_FSYNC if fsync is None else fsync
+        self._likes = Counter()
+        self._inserts = []  # (record, Future of the new id)
+        self._flushing = 0
+        self._force = False
+        self._closed = False
+        self._journal = None
+        self._slot_lock = None
+        self._conn = None
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def start(self):
+        """Replay leftover journals, then start the writer thread"""
+        migrate(self.db_name)
+        self._conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        self._conn.execute(f"PRAGMA busy_timeout = {int(Config.DB_BUSY_TIMEOUT_MS)}")
+        register_functions(self._conn, self.db_name)
+        self._claim_slot()
+        self._recover(self.journal_path)
+        self._recover_orphaned_slots()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Flush everything still pending and stop the writer thread"""
+        with self._cond:
+            if self._closed or self._thread is None:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._journal.close()
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) == 0:
+            os.remove(self.journal_path)
+        self._slot_lock.close()
+        self._conn.close()
+
+    def like(self, conv_id):
+        """Queue a like; increments for the same conversation are summed"""
+        with self._cond:
+            self._append({"op": "like", "id": conv_id})
+            self._likes[conv_id] += 1
+            if len(self._likes) >= self.max_pending:
+                self._cond.notify_all()
+
+    def save_conversation(self, query, response, model_used, usage=None):
+        """Queue a conversation insert; returns a Future of its id"""
+        record = {
+            "op": "insert",
+            "uid": uuid.uuid4().hex,
+            "query": query,
+            "response": response,
+            "model_used": model_used,
+            "timestamp": int(time.time()),
+            "usage": usage,
+        }
+        future = Future()
+        with self._cond:
+            self._append(record)
+            self._inserts.append((record, future))
+            # Inserts have a waiter, so they go out with the next batch
+            self._cond.notify_all()
+        return future
+
+    def insert(self, query, response, model_used, usage=None, timeout=None):
+        """Queue a conversation insert and wait for its id.
+
+        Gives up after WRITE_BEHIND_SAVE_TIMEOUT seconds; an insert that is
+        not in a batch yet by then is dropped, so it is never applied later.
+        """
+        timeout = timeout or Config.WRITE_BEHIND_SAVE_TIMEOUT
+        future = self.save_conversation(query, response, model_used, usage)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise RuntimeError("Timed out waiting for the database writer") from None
+        # Already being written; its batch settles it within WRITE_BEHIND_MAX_ATTEMPTS
+        return future.result(timeout=timeout)
+
+    def flush(self):
+        """Block until everything queued so far is committed"""
+        with self._cond:
+            self._force = True
+            self._cond.notify_all()
+            while (self._likes or self._inserts or self._flushing) and self._thread.is_alive():
+                self._cond.wait(0.1)
+
+    def _append(self, record):
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed")
+        self._write_journal(record)
+
+    def _write_journal(self, record):
+        self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not (self._inserts or self._closed or self._force or len(self._likes) >= self.max_pending):
+                    self._cond.wait(self.flush_interval)
+                self._force = False
+                if not (self._likes or self._inserts):
+                    if self._closed:
+                        return
+                    continue
+                likes, inserts = self._likes, self._inserts
+                self._likes, self._inserts = Counter(), []
+                # Callers that gave up waiting are left out of the batch
+                cancelled = [item for item in inserts if not item[1].set_running_or_notify_cancel()]
+                inserts = [item for item in inserts if not item[1].cancelled()]
+                try:
+                    self._discard(cancelled)
+                    batch_id, batch_path = self._rotate_journal()
+                except Exception as e:
+                    logger.exception("Write-behind journal rotation failed")
+                    # The likes are still in the live journal; retry them with the next batch
+                    self._likes.update(likes)
+                    self._fail(inserts, e)
+                    self._cond.notify_all()
+                    if self._closed:
+                        return  # Replayed on the next start
+                    self._cond.wait(self.flush_interval)
+                    continue
+                self._flushing += 1
+            try:
+                self._write_batch(batch_id, batch_path, likes, inserts)
+            except Exception as e:
+                logger.exception("Write-behind batch %s failed", batch_id)
+                self._fail([item for item in inserts if not item[1].done()], e, batch_path)
+            finally:
+                with self._cond:
+                    self._flushing -= 1
+                    self._cond.notify_all()
+
+    def _discard(self, inserts, journal_path=None):
+        """Record in a journal (the live one by default) that these inserts must never be replayed"""
+        if not inserts:
+            return
+        record = {"op": "discard", "uids": [record["uid"] for record, _ in inserts]}
+        if journal_path is None:
+            self._write_journal(record)
+            return
+        with open(journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _fail(self, inserts, error, journal_path=None):
+        """Fail inserts the database never got, marking them discarded in the journal holding them"""
+        try:
+            self._discard(inserts, journal_path)
+        except Exception:
+            logger.exception("Could not mark failed inserts in the write-behind journal")
+        for _, future in inserts:
+            future.set_exception(error)
+
+    def _rotate_journal(self):
+        """Move the journal covering the pending writes aside under a new batch id"""
+        batch_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        batch_path = f"{self.journal_path}.{batch_id}"
+        self._journal.close()
+        try:
+            os.replace(self.journal_path, batch_path)
+        finally:
+            # Reopened even if the move failed, so later writes can still be journaled
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        return batch_id, batch_path
+
+    def _write_batch(self, batch_id, batch_path, likes, inserts):
+        records = [record for record, _ in inserts]
+        error = None
+        for attempt in range(Config.WRITE_BEHIND_MAX_ATTEMPTS):
+            try:
+                ids = self._apply(batch_id, likes, records)
+                break
+            except Exception as e:
+                error = e
+                time.sleep(0.1 * 2 ** attempt)
+        else:
+            logger.error("Write-behind batch %s failed after %d attempts: %s",
+                         batch_id, Config.WRITE_BEHIND_MAX_ATTEMPTS, error)
+            self._quarantine(batch_path, likes)
+            for _, future in inserts:
+                future.set_exception(error)
+            return
+        try:
+            os.remove(batch_path)
+        except OSError:
+            # The batch id is recorded, so replaying this journal is a no-op
+            logger.exception("Could not remove write-behind batch journal %s", batch_path)
+        if likes:
+            events.publish("likes_applied", conv_ids=list(likes))
+        for (_, future), conv_id in zip(inserts, ids):
+            future.set_result(conv_id)
+
+    def _quarantine(self, batch_path, likes):
+        """Set a failed batch aside so its inserts, about to be reported failed, are never replayed"""
+        os.replace(batch_path, f"{batch_path}.failed")
+        with self._cond:
+            # Likes have no waiter, so they are retried with the next batch (or the next start)
+            for conv_id, count in likes.items():
+                self._write_journal({"op": "like", "id": conv_id, "count": count})
+                if not self._closed:
+                    self._likes[conv_id] += count
+
+    def _apply(self, batch_id, likes, records):
+        """Apply one batch as a single transaction; returns the new conversation ids"""
+        with self._conn:
+            if self._conn.execute(
+                "SELECT 1 FROM write_behind_batches WHERE batch_id = ?", (batch_id,)
+            ).fetchone():
+                return []
+            ids = []
+            codec = get_response_codec(self.db_name)
+            for record in records:
+                usage = record.get("usage") or {}
+                cursor = self._conn.execute(
+                    """INSERT INTO conversations
+                       (query, response, timestamp, model_used, prompt_tokens, output_tokens, total_tokens)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (record["query"], codec.encode(record["response"]), record["timestamp"], record["model_used"],
+                     usage.get("prompt_tokens"), usage.get("output_tokens"), usage.get("total_tokens"))
+                )
+                ids.append(cursor.lastrowid)
+            self._conn.executemany(
+                "UPDATE conversations SET likes = likes + ? WHERE id = ?",
+                [(count, conv_id) for conv_id, count in likes.items()]
+            )
+            self._conn.execute(
+                "INSERT INTO write_behind_batches (batch_id, applied_at) VALUES (?, ?)",
+                (batch_id, int(time.time()))
+            )
+        return ids
+
+    def _read_journal(self, path):
+        likes, records, discarded = Counter(), [], set()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A write torn by the crash was never acknowledged
+                if record["op"] == "like":
+                    likes[record["id"]] += record.get("count", 1)
+                elif record["op"] == "discard":
+                    discarded.update(record["uids"])
+                else:
+                    records.append(record)
+        return likes, [record for record in records if record.get("uid") not in discarded]
+
+    def _slot_paths(self):
+        """Journal paths of every slot that has ever been used, the base journal first"""
+        base = self.base_journal_path
+        directory = os.path.dirname(os.path.abspath(base))
+        prefix = os.path.basename(base) + "-"
+        numbers = sorted(
+            int(name[len(prefix):-len(".lock")]) for name in os.listdir(directory)
+            if name.startswith(prefix) and name.endswith(".lock") and name[len(prefix):-len(".lock")].isdigit()
+        )
+        return [base] + [f"{base}-{number}" for number in numbers]
+
+    def _claim_slot(self):
+        """Lock the first journal slot no live process holds and write to it"""
+        self.base_journal_path = self.journal_path
+        number = 0
+        while True:
+            path = self.base_journal_path if number == 0 else f"{self.base_journal_path}-{number}"
+            self._slot_lock = _try_lock(f"{path}.lock")
+            if self._slot_lock is not None:
+                self.journal_path = path
+                return
+            number += 1
+
+    def _recover_orphaned_slots(self):
+        """Replay the journals of other slots whose process is gone"""
+        for path in self._slot_paths():
+            if path == self.journal_path:
+                continue
+            lock = _try_lock(f"{path}.lock")
+            if lock is None:
+                continue  # A live process owns it
+            try:
+                self._recover(path)
+            finally:
+                lock.close()
+
+    def _recover(self, journal_path):
+        """Replay batch journals and the live journal a crash left behind in one slot"""
+        directory = os.path.dirname(os.path.abspath(journal_path))
+        prefix = os.path.basename(journal_path) + "."
+        leftovers = sorted(
+            name for name in os.listdir(directory)
+            if name.startswith(prefix) and not name.endswith((".lock", ".failed"))
+        )
+        if os.path.exists(journal_path):
+            batch_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+            os.replace(journal_path, f"{journal_path}.{batch_id}")
+            leftovers.append(prefix + batch_id)
+        for name in leftovers:
+            path = os.path.join(directory, name)
+            likes, records = self._read_journal(path)
+            self._apply(name[len(prefix):], likes, records)
+            os.remove(path)
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM write_behind_batches WHERE applied_at < ?",
+                (int(time.time()) - Config.WRITE_BEHIND_BATCH_RETENTION,)
+            )